@@ -7,8 +7,138 @@ Created on Fri Apr 20 23:57:37 2018
 
 import FileParser
 import pandas as pd
+import numpy as np
 import pickle
 import os
+import hashlib
+import functools
+
+# Serve a *_data_for_* method from the dataset cache. The key covers the
+# method, which and the years given by the method @years of the loader. An
+# entry is only used while the persisted processes the method read when
+# building it are unchanged, see cache_sources. The parser is interned by
+# the methods (see _intern) and always restored afterwards, even if the
+# method fails.
+def cached_dataset(years):
+    def decorator(method):
+        def build(self, which):
+            try:
+                return method(self, which)
+            finally:
+                self.parser.interned = self.interned
+        
+        @functools.wraps(method)
+        def wrapper(self, which="small"):
+            if not self.cache or hasattr(self,"data"):
+                return build(self, which)
+            
+            key = self.cache_key(method.__name__, which, getattr(self,years)(which))
+            file = os.path.join(self.path_cache, key + ".pkl")
+            if os.path.isfile(file):
+                with open(file,"rb") as f:
+                    # the sources are pickled before the dataset
+                    sources = pickle.load(f)
+                    if sources == self.cache_sources(sources):
+                        self.years, self.data = pickle.load(f)
+                        # most recently used
+                        os.utime(file)
+                        return self
+            
+            self.parser.read = set()
+            build(self, which)
+            
+            os.makedirs(self.path_cache, exist_ok=True)
+            with open(file,"wb") as f:
+                pickle.dump(self.cache_sources(self.parser.read), f)
+                pickle.dump((self.years, self.data), f)
+            self.evict_cache()
+            return self
+        return wrapper
+    return decorator
+
+# Lazy query of the papers of some years. The language and the attribute
+# columns are declared up front and pushed down into the parser: the
+# chapters of other languages are dropped while reading the columnar
+# stores and attributes that are not asked for are never read.
+#
+#   d.query(["2015","2016"]).language("En").columns("chapter_abstract").load()
+class PaperQuery:
+    
+    # attribute column -> process per year
+    attributes = {
+            "bookedition":"chapters_bookeditions_{}",
+            "chapter_title":"chapters_{}#title",
+            "chapter_language":"chapters_{}#language",
+            "chapter_abstract":"chapters_{}#abstract"
+    }
+    
+    # columns of DataLoader.papers()
+    default_columns = ["bookedition","chapter_title","chapter_language"]
+    
+    def __init__(self, loader, years):
+        self.loader = loader
+        self.parser = loader.parser
+        self.years = [str(y) for y in years]
+        self.selected = list(self.default_columns)
+        self.selected_language = "En"
+    
+    # keep only chapters in @language, None keeps all chapters
+    def language(self, language):
+        self.selected_language = language
+        return self
+    
+    # attribute columns besides chapter and book
+    def columns(self, *columns):
+        for column in columns:
+            if column not in self.attributes:
+                raise KeyError("unknown column {}.".format(column))
+        self.selected = list(columns)
+        return self
+    
+    # chapters of year @y in the selected language (URIs)
+    def _chapters(self, y):
+        process = "chapters_" + y + "#language"
+        filters = {"chapter_language":[self.selected_language]}
+        try:
+            return self.parser.getTable(process, ["chapter","chapter_language"], filters).column("chapter")
+        except ImportError:
+            chapters, languages = self.parser.getValues(process)
+            return [c for c, l in zip(chapters, languages) if l == self.selected_language]
+    
+    # data frames of the process @template for all years, restricted to
+    # the selected chapters
+    def _collect(self, template, columns, filters):
+        return pd.concat([
+                self.parser.getDataFrame(template.format(y), columns, filters[y])
+                for y in self.years
+        ])
+    
+    # run the query and return the papers
+    def frame(self):
+        if self.selected_language is None:
+            filters = {y:None for y in self.years}
+        else:
+            filters = {y:{"chapter":self._chapters(y)} for y in self.years}
+        
+        data = self.loader._join(
+                self._collect("chapters_books_{}", ["chapter","book"], filters),
+                "chapter",
+                [
+                        self._collect(self.attributes[column], ["chapter",column], filters)
+                        for column in self.selected
+                ]
+        )
+        if "chapter_abstract" in data:
+            data.chapter_abstract = self.loader._abstract_text(data.chapter_abstract)
+        return data.reset_index(drop=True)
+    
+    # run the query and add the papers to the loader
+    def load(self):
+        if hasattr(self.loader,"years"):
+            raise AttributeError("years already set.")
+        self.loader.years = self.years
+        return self.loader.papers(frame=self.frame())
+
 
 class DataLoader:
     
@@ -19,11 +149,43 @@ class DataLoader:
     
     #path = FileParser.FileParser.path_persistent
     
-    def __init__(self):
-        self.parser = FileParser.FileParser()
+    path_cache = os.path.join(path,"cache")
+    
+    # upper bound of the dataset cache in bytes
+    cache_size = 10 * 2**30
+    
+    # bump when the preparation of cached datasets changes
+    cache_version = 2
+    
+    # processes of the files of one year, freed after each year by iter_data
+    year_processes = [
+            "chapters_{}",
+            "chapters_{}#abstract",
+            "chapters_{}#title",
+            "chapters_{}#language",
+            "chapters_books_{}",
+            "chapters_bookeditions_{}",
+            "contributions_{}",
+            "contributions_{}#publishedName",
+            "contributions_{}#isCorresponding",
+            "contributions_{}#order",
+            "contributions_chapters_{}"
+    ]
+    
+    def __init__(self, interned=False, cache=True):
+        # keep entity columns as int32 ids instead of URIs
+        self.interned = interned
+        # serve *_data_for_* methods from the dataset cache
+        self.cache = cache
+        self.parser = FileParser.FileParser(interned=interned)
       
-    # add papers
-    def papers(self, years=None):
+    # lazy query of the papers of @years, see PaperQuery
+    def query(self, years):
+        return PaperQuery(self, years)
+    
+    
+    # add papers (or the papers of a query given as @frame)
+    def papers(self, years=None, frame=None):
         if hasattr(self,"years") and years is not None:
             raise AttributeError("years already set.")
         elif years is not None:
@@ -31,42 +193,11 @@ class DataLoader:
         elif not hasattr(self,"years"):
             raise AttributeError("years needed.")
 
-        data = None
-        
-        for y in self.years:
-            df_chapters = pd.DataFrame(
-                    list(self.parser.getData("chapters_books_" + y).items()),
-                    columns=["chapter","book"]
-            )
-            df_bookeditions = pd.DataFrame(
-                    list(self.parser.getData("chapters_bookeditions_" + y).items()),
-                    columns=["chapter","bookedition"]
-            )
-            df_title = pd.DataFrame(
-                    list(self.parser.getData("chapters_" + y + "#title").items()),
-                    columns=["chapter","chapter_title"]
-            )
-            df_language = pd.DataFrame(
-                    list(self.parser.getData("chapters_" + y + "#language").items()),
-                    columns=["chapter","chapter_language"]
-            )
-            
-            df = pd.merge(df_chapters, df_bookeditions, how="left", on=["chapter", "chapter"])
-            df = pd.merge(df, df_title, how="left", on=["chapter", "chapter"])
-            df = pd.merge(df, df_language, how="left", on=["chapter", "chapter"])
-            
-            if data is None:
-                data = df
-            else:
-                data = pd.concat([data,df])
-        
-        data.chapter_language = data.chapter_language.str[1:-1]
-        data.chapter_title = data.chapter_title.str[1:-1]
-        data = data[data.chapter_language=="En"]
+        data = frame if frame is not None else self.query(self.years).frame()
         
         if hasattr(self,"data"):
             if "chapter" in self.data.keys():
-                self.data = pd.merge(self.data, data, how="left", on=["chapter", "chapter"])
+                self.data = self._join(self.data, "chapter", [data]).reset_index(drop=True)
             else:
                 raise KeyError("needs papers.")
         else:
@@ -84,24 +215,16 @@ class DataLoader:
         elif not hasattr(self,"years"):
             raise AttributeError("years needed.")
             
-        data = None
-            
-        for y in self.years:
-            df = pd.DataFrame(
-                    list(self.parser.getData("chapters_" + y + "#abstract").items()),
-                    columns=["chapter","chapter_abstract"]
-            )
-            
-            if data is None:
-                data = df
-            else:
-                data = pd.concat([data,df])
+        data = self._collect(
+                ["chapters_" + y + "#abstract" for y in self.years],
+                ["chapter","chapter_abstract"]
+        )
         
-        data.chapter_abstract = data.chapter_abstract.str[9:-1]
+        data.chapter_abstract = self._abstract_text(data.chapter_abstract)
         
         if hasattr(self,"data"):
             if "chapter" in self.data.keys():
-                self.data = pd.merge(self.data, data, how="left", on=["chapter", "chapter"])
+                self.data = self._join(self.data, "chapter", [data]).reset_index(drop=True)
             else:
                 raise KeyError("needs papers.")
         else:
@@ -110,71 +233,44 @@ class DataLoader:
         return self
     
     
+    # abstract texts without the markup around them
+    @staticmethod
+    def _abstract_text(abstracts):
+        return abstracts.str[9:-1]
+    
+    
     # load conferences
     def conferences(self):
         if not hasattr(self,"data"):
-            df_conferences = pd.DataFrame(
-                    self.parser.getData("conferences"),
-                    columns=["conference"]
+            df_conferences = self.parser.getDataFrame(
+                    "conferences",
+                    ["conference"]
             )
 
         elif "book" in self.data.keys():
-            df_conferences = pd.DataFrame(
-                    list(self.parser.getData("books_conferences").items()),
-                    columns=["book","conference"]
+            df_conferences = self.parser.getDataFrame(
+                    "books_conferences",
+                    ["book","conference"]
             )
         else:
             raise KeyError("Needs papers.")
         
-        df_acronym = pd.DataFrame(
-                list(self.parser.getData("conferences#acronym").items()),
-                columns=["conference","conference_acronym"]
-        )
-        df_city = pd.DataFrame(
-                list(self.parser.getData("conferences#city").items()),
-                columns=["conference","conference_city"]
-        )
-        df_country = pd.DataFrame(
-                list(self.parser.getData("conferences#country").items()),
-                columns=["conference","conference_country"]
-        )
-        df_dateend = pd.DataFrame(
-                list(self.parser.getData("conferences#dateend").items()),
-                columns=["conference","conference_dateend"]
+        df = self._join(
+                df_conferences,
+                "conference",
+                [
+                        self.parser.getDataFrame(
+                                "conferences#" + attribute,
+                                ["conference","conference_" + attribute]
+                        )
+                        for attribute in ["acronym","city","country","dateend","datestart","name","year"]
+                ]
         )
-        df_datestart = pd.DataFrame(
-                list(self.parser.getData("conferences#datestart").items()),
-                columns=["conference","conference_datestart"]
-        )
-        df_name = pd.DataFrame(
-                list(self.parser.getData("conferences#name").items()),
-                columns=["conference","conference_name"]
-        )
-        df_year = pd.DataFrame(
-                list(self.parser.getData("conferences#year").items()),
-                columns=["conference","conference_year"]
-        )
-            
-        df = pd.merge(df_conferences, df_acronym, how="left", on=["conference", "conference"])
-        df = pd.merge(df, df_city, how="left", on=["conference", "conference"])
-        df = pd.merge(df, df_country, how="left", on=["conference", "conference"])
-        df = pd.merge(df, df_dateend, how="left", on=["conference", "conference"])
-        df = pd.merge(df, df_datestart, how="left", on=["conference", "conference"])
-        df = pd.merge(df, df_name, how="left", on=["conference", "conference"])
-        df = pd.merge(df, df_year, how="left", on=["conference", "conference"])
-        
-        df.conference_name = df.conference_name.str[1:-1]
-        df.conference_datestart = df.conference_datestart.str[1:-1]
-        df.conference_dateend = df.conference_dateend.str[1:-1]
-        df.conference_year = df.conference_year.str[1:-1]
-        df.conference_city = df.conference_city.str[1:-1]
-        df.conference_country = df.conference_country.str[1:-1]
-        df.conference_acronym = df.conference_acronym.str[1:-1]
 
         if hasattr(self,"data"):
-            self.data = pd.merge(self.data, df, how="left", on=["book", "book"])
+            self.data = self._join(self.data, "book", [df]).reset_index(drop=True)
         else:
-            self.data = df
+            self.data = df.reset_index(drop=True)
         
         return self
     
@@ -189,75 +285,38 @@ class DataLoader:
             raise AttributeError("years needed.")
             
         if not hasattr(self,"data"):
-            data = None
-            
-            for y in self.years:
-                df_contribution = pd.DataFrame(
-                    list(self.parser.getData("contributions_" + str(y)).items()),
-                    columns=["contribution"]
-                )
-                
-                if data is None:
-                    data = df_contribution
-                else:
-                    data = pd.concat([data,df_contribution])
+            data = self._collect(
+                    ["contributions_" + str(y) for y in self.years],
+                    ["contribution"]
+            )
         
         elif "chapter" in self.data.keys(): 
-            data = None
-                
-            for y in self.years:
-                df_contribution = pd.DataFrame(
-                        list(self.parser.getData("contributions_chapters_" + y).items()),
-                        columns=["contribution","chapter"]
-                )
-                
-                if data is None:
-                    data = df_contribution
-                else:
-                    data = pd.concat([data,df_contribution])
+            data = self._collect(
+                    ["contributions_chapters_" + y for y in self.years],
+                    ["contribution","chapter"]
+            )
         
         else:
             raise KeyError("Needs papers.")
         
-        df = None
-        for y in self.years:
-            df_publishedName = pd.DataFrame(
-                    list(self.parser.getData("contributions_" + y + "#publishedName").items()),
-                    columns=["contribution","author_name"]
-            )
-            if df is None:
-                df = df_publishedName
-            else:
-                df = pd.concat([df,df_publishedName])
-        data = pd.merge(data, df, how="left", on=["contribution", "contribution"])
-        
-        df = None
-        for y in self.years:
-            df_order = pd.DataFrame(
-                    list(self.parser.getData("contributions_" + y + "#order").items()),
-                    columns=["contribution","author_order"]
-            )
-            if df is None:
-                df = df_order
-            else:
-                df = pd.concat([df,df_order])
-        data = pd.merge(data, df, how="left", on=["contribution", "contribution"])
-        
-        df = None
-        for y in self.years:
-            df_isCorresponding = pd.DataFrame(
-                    list(self.parser.getData("contributions_" + y + "#isCorresponding").items()),
-                    columns=["contribution","author_corresponding"]
-            )
-            if df is None:
-                df = df_isCorresponding
-            else:
-                df = pd.concat([df,df_isCorresponding])
-        data = pd.merge(data, df, how="left", on=["contribution", "contribution"])
-            
-        data.author_name = data.author_name.str[1:-1]
-        data.author_order = data.author_order.str[1:-1]
-        data.author_corresponding = data.author_corresponding.str[1:-1]
+        data = self._join(
+                data,
+                "contribution",
+                [
+                        self._collect(
+                                ["contributions_" + y + "#publishedName" for y in self.years],
+                                ["contribution","author_name"]
+                        ),
+                        self._collect(
+                                ["contributions_" + y + "#order" for y in self.years],
+                                ["contribution","author_order"]
+                        ),
+                        self._collect(
+                                ["contributions_" + y + "#isCorresponding" for y in self.years],
+                                ["contribution","author_corresponding"]
+                        )
+                ]
+        ).reset_index(drop=True)
 
         if hasattr(self,"data"):
             self.data = pd.merge(self.data, data, how="right", on=["chapter", "chapter"])
@@ -270,30 +329,32 @@ class DataLoader:
     # load conferenceseries
     def conferenceseries(self):
         if not hasattr(self,"data"):
-            df_conferenceseries = pd.DataFrame(
-                    self.parser.getData("conferenceseries"),
-                    columns=["conferenceseries"]
+            df_conferenceseries = self.parser.getDataFrame(
+                    "conferenceseries",
+                    ["conferenceseries"]
             )
 
         elif "conference" in self.data.keys():
-            df_conferenceseries = pd.DataFrame(
-                    list(self.parser.getData("conferences_conferenceseries").items()),
-                    columns=["conference","conferenceseries"]
+            df_conferenceseries = self.parser.getDataFrame(
+                    "conferences_conferenceseries",
+                    ["conference","conferenceseries"]
             )
         else:
             raise KeyError("Needs conferences.")
             
-        df_name = pd.DataFrame(
-                list(self.parser.getData("conferenceseries#name").items()),
-                columns=["conferenceseries","conferenceseries_name"]
+        df = self._join(
+                df_conferenceseries,
+                "conferenceseries",
+                [
+                        self.parser.getDataFrame(
+                                "conferenceseries#name",
+                                ["conferenceseries","conferenceseries_name"]
+                        )
+                ]
         )
-          
-        df = pd.merge(df_conferenceseries, df_name, how="left", on=["conferenceseries", "conferenceseries"])
-        
-        df.conferenceseries_name = df.conferenceseries_name.str[1:-1]
         
         if hasattr(self,"data"):
-            self.data = pd.merge(self.data, df, how="left", on=["conference", "conference"])
+            self.data = self._join(self.data, "conference", [df]).reset_index(drop=True)
         else:
             self.data = df
             
@@ -303,31 +364,30 @@ class DataLoader:
     # load keywords
     def keywords(self):
         if not hasattr(self,"data"):
-            df_keywords = pd.DataFrame(
-                    list(self.parser.getData("bookeditions#marketcodes").items()),
-                    columns=["bookedition","keyword"]
+            df_keywords = self.parser.getDataFrame(
+                    "bookeditions#marketcodes",
+                    ["bookedition","keyword"]
             )
         elif "bookedition" in self.data.keys():
-            df_keywords = pd.DataFrame(
-                    list(self.parser.getData("bookeditions#marketcodes").items()),
-                    columns=["bookedition","keyword"]
+            df_keywords = self.parser.getDataFrame(
+                    "bookeditions#marketcodes",
+                    ["bookedition","keyword"]
             )
         else:
             raise KeyError("Needs papers.")
             
-        df_name = pd.DataFrame(
-                list(self.parser.getData("marketcodes#name").items()),
-                columns=["keyword","keyword_label"]
+        df_name = self.parser.getDataFrame(
+                "marketcodes#name",
+                ["keyword","keyword_label"]
         )
                 
-        df_keywords = df_keywords.set_index(["bookedition"])["keyword"].apply(pd.Series).stack()
-        df_keywords = df_keywords.reset_index()
-        df_keywords.columns = ["bookedition","keyword_num","keyword"]
+        df_keywords = df_keywords.explode("keyword", ignore_index=True)
+        df_keywords = df_keywords[df_keywords.keyword.notna()]
+        df_keywords.insert(1, "keyword_num", df_keywords.groupby("bookedition", sort=False).cumcount())
+        df_keywords = df_keywords.reset_index(drop=True)
         
         df = pd.merge(df_keywords, df_name, how="left", on=["keyword", "keyword"])
         
-        df.keyword_label = df.keyword_label.str[1:-1]
-        
         if hasattr(self,"data"):
             self.data = pd.merge(self.data, df, how="left", on=["bookedition", "bookedition"])
         else:
@@ -336,6 +396,60 @@ class DataLoader:
         return self
     
     
+    # market codes of the chapters in self.data (rows added by keywords())
+    # without URI prefix, chapters without keywords are dropped
+    def _keyword_rows(self):
+        data = self.data[["chapter","keyword","conferenceseries"]]
+        data = data[data.keyword.notna()]
+        keyword = data.keyword.str.replace("<http://scigraph.springernature.com/things/product-market-codes/","")
+        return data.assign(keyword=keyword.str[0:-1])
+    
+    
+    # replace the keyword rows of self.data by one keyword bag per chapter
+    # (and conference series): the market codes joined by spaces
+    def keyword_bags(self):
+        data = self._keyword_rows()
+        bags = data.keyword.groupby(data.chapter).agg(" ".join) + " "
+        self.data = pd.merge(
+                bags.rename("keyword").reset_index(),
+                data[["chapter","conferenceseries"]].drop_duplicates(),
+                how="outer",
+                on="chapter"
+        )
+        return self
+    
+    
+    # data frames of @processes (one per year) concatenated in one call
+    def _collect(self, processes, columns):
+        return pd.concat(
+                [self.parser.getDataFrame(process, columns) for process in processes]
+        )
+    
+    
+    # left join of the @attributes frames to @data on column @key, each
+    # attribute frame is indexed by the key before joining
+    def _join(self, data, key, attributes):
+        for attribute in attributes:
+            data = data.join(attribute.set_index(key), on=key)
+        return data
+    
+    
+    # intern entity URIs while building a dataset
+    def _intern(self):
+        self.parser.interned = True
+        return self
+    
+    
+    # map interned ids in self.data back to URIs, optionally restoring
+    # the order of a column that was sorted while it held ids
+    def resolve(self, sort=None):
+        self.data = self.parser.getURIs().resolveFrame(self.data)
+        self.parser.interned = self.interned
+        if sort is not None:
+            self.data = self.data.sort_values(sort, kind="mergesort").reset_index(drop=True)
+        return self
+    
+    
     # save in pickle file
     def make_persistent(self, filename):
         file = os.path.join(self.path,filename)
@@ -352,14 +466,64 @@ class DataLoader:
                 return True
         except FileNotFoundError:
             return False   
+    
+    
+    # key of a cached dataset: the method, which, the years and the
+    # versions of the parser data formats
+    def cache_key(self, method, which, years):
+        key = hashlib.sha1()
+        key.update(repr((
+                self.cache_version,
+                self.parser.persistentVersion,
+                self.parser.columnarVersion,
+                method,
+                which,
+                [str(y) for y in years]
+        )).encode())
+        return key.hexdigest()
+    
+    
+    # size and time of the persisted files of @processes (the pickle or, if
+    # there is none, the columnar file), None for missing files
+    def cache_sources(self, processes):
+        sources = {}
+        for process in sorted(processes):
+            file = self.parser.processes[process]["persistentFile"]
+            if not os.path.isfile(file):
+                file = self.parser.getColumnarFile(process)
+            if os.path.isfile(file):
+                stat = os.stat(file)
+                sources[process] = (stat.st_size, stat.st_mtime)
+            else:
+                sources[process] = None
+        return sources
+    
+    
+    # remove the least recently used datasets above self.cache_size
+    def evict_cache(self):
+        files = [
+                os.path.join(self.path_cache, filename)
+                for filename in os.listdir(self.path_cache)
+                if filename.endswith(".pkl")
+        ]
+        files.sort(key=os.path.getmtime, reverse=True)
+        size = 0
+        for file in files:
+            size += os.path.getsize(file)
+            if size > self.cache_size:
+                os.remove(file)
         
     ######################################
     # Get training data
     def training_data(self, which="small"):
+        return self.papers(self.training_years(which)).conferences().conferenceseries()
+    
+    # years of the training data
+    def training_years(self, which="small"):
         if which == "small":
-            return self.papers(["2013","2014","2015"]).conferences().conferenceseries()
+            return ["2013","2014","2015"]
         elif which == "medium":
-            years = [
+            return [
                 "2015",
                 "2014",
                 "2013",
@@ -367,81 +531,58 @@ class DataLoader:
                 "2011",
                 "2009-2010"
             ]
-            return self.papers(years).conferences().conferenceseries()
         else:
             years = self.parser.years.copy()
             years.remove(2016)
             years.remove(2017)
-            return self.papers(years).conferences().conferenceseries()
+            return years
+        
+    # lazy query of the training papers
+    def training_query(self, which="small"):
+        return self.query(self.training_years(which))
         
     ######################################
     # Get training data for abstract models.
+    @cached_dataset("training_years")
     def training_data_for_abstracts(self,which="small"):
-        self.training_data(which).abstracts()
+        self._intern().training_query(which).columns("chapter_abstract").load().conferences().conferenceseries()
         self.data = self.data[["chapter_abstract","conferenceseries"]].copy()
         self.data.drop(
             list(self.data[pd.isnull(self.data.chapter_abstract)].index),
             inplace=True
         )
-        self.data.chapter_abstract = self.data.chapter_abstract.str.decode("unicode_escape")
         self.data = self.data.reset_index()
         self.data = self.data[["chapter_abstract","conferenceseries"]]
         
+        self.resolve()
+        
         return self
     
     ######################################
     # Get training data for keyword models.
+    @cached_dataset("training_years")
     def training_data_for_keywords(self,which="small"):
-        self.training_data(which).keywords()
-        
-        self.data.keyword = self.data.keyword.str.replace("<http://scigraph.springernature.com/things/product-market-codes/","")
-        self.data.keyword = self.data.keyword.str[0:-1]
-        
-        self.data = self.data[["chapter","keyword","conferenceseries"]].copy()
-        self.data.drop(
-            list(self.data[pd.isnull(self.data.keyword)].index),
-            inplace=True
-        )
+        self._intern().training_data(which).keywords()
         
-        conferenceseries = self.data[["chapter","conferenceseries"]].drop_duplicates()
-        self.data.keyword = self.data.keyword + " "
-        self.data = pd.merge(
-                self.data.groupby("chapter").sum().reset_index()[["chapter","keyword"]],
-                conferenceseries,
-                how="outer",
-                on="chapter"
-        )
+        self.keyword_bags()
         
         #self.data.chapter_abstract = self.data.chapter_abstract.str.decode("unicode_escape")
         self.data = self.data.reset_index()
         self.data = self.data[["chapter","keyword","conferenceseries"]]
         
+        self.resolve(sort="chapter")
+        
         return self
     
     ######################################
     # Get training data for combined models.
+    @cached_dataset("training_years")
     def training_data_for_abstracts_and_keywords(self,which="small"):
-        self.training_data(which).keywords()
+        self._intern().training_data(which).keywords()
         
         # Preprocess keywords.
         
-        self.data.keyword = self.data.keyword.str.replace("<http://scigraph.springernature.com/things/product-market-codes/","")
-        self.data.keyword = self.data.keyword.str[0:-1]
-        
-        self.data = self.data[["chapter","keyword","conferenceseries"]].copy()
-        self.data.drop(
-            list(self.data[pd.isnull(self.data.keyword)].index),
-            inplace=True
-        )
-        
-        conferenceseries = self.data[["chapter","conferenceseries"]].drop_duplicates()
-        self.data.keyword = self.data.keyword + " "
-        self.data = pd.merge(
-                self.data.groupby("chapter").sum().reset_index()[["chapter","keyword"]],
-                conferenceseries,
-                how="outer",
-                on="chapter"
-        )
+        self.keyword_bags()
         
         # Preprocess abstracts.
         
@@ -450,85 +591,112 @@ class DataLoader:
             list(self.data[pd.isnull(self.data.chapter_abstract)].index),
             inplace=True
         )
-        self.data.chapter_abstract = self.data.chapter_abstract.str.decode("unicode_escape")
         self.data = self.data.reset_index()
         self.data = self.data[["chapter","keyword","chapter_abstract","conferenceseries"]]
         
+        self.resolve(sort="chapter")
+        
         return self
         
     ######################################
     # Get test data.
     def test_data(self, which="small"):
-        return self.papers(["2016"]).conferences().conferenceseries()
+        return self.papers(self.test_years(which)).conferences().conferenceseries()
+    
+    # years of the test data
+    def test_years(self, which="small"):
+        return ["2016"]
+    
+    # lazy query of the test papers
+    def test_query(self, which="small"):
+        return self.query(self.test_years(which))
+    
+    ######################################
+    # Iterate over the training data in chunks.
+    def iter_training_data(self, which="all", fields=("abstracts",), chunk_size=10000, shuffle=False, seed=None):
+        return self.iter_data(self.training_years(which), fields, chunk_size, shuffle, seed)
+    
+    ######################################
+    # Iterate over the test data in chunks.
+    def iter_test_data(self, which="small", fields=("abstracts",), chunk_size=10000, shuffle=False, seed=None):
+        return self.iter_data(self.test_years(which), fields, chunk_size, shuffle, seed)
+    
+    # Yields frames of at most @chunk_size papers with their conferences
+    # and conference series, one year after the other, so only the data of
+    # one year is in memory. @fields are further loader calls per year
+    # ("abstracts", "keywords", "contributions"). With @shuffle the years
+    # and the rows within each year are visited in random order.
+    def iter_data(self, years, fields=("abstracts",), chunk_size=10000, shuffle=False, seed=None):
+        years = [str(y) for y in years]
+        random = np.random.default_rng(seed)
+        if shuffle:
+            years = [years[i] for i in random.permutation(len(years))]
+            
+        for y in years:
+            d = DataLoader(interned=self.interned, cache=False)
+            d.parser = self.parser
+            # abstracts are pushed down into the query of the year
+            columns = list(PaperQuery.default_columns)
+            if "abstracts" in fields:
+                columns.append("chapter_abstract")
+            d.query([y]).columns(*columns).load().conferences().conferenceseries()
+            for field in fields:
+                if field != "abstracts":
+                    getattr(d, field)()
+            data = d.data.reset_index(drop=True)
+            del d
+            
+            # the data of this year is not needed anymore
+            for process in self.year_processes:
+                self.parser.persistent.pop(process.format(y), None)
+                    
+            if shuffle:
+                data = data.iloc[random.permutation(len(data))].reset_index(drop=True)
+            for start in range(0, len(data), chunk_size):
+                yield data.iloc[start:start + chunk_size]
     
     ######################################
     # Get test data for abstract models.
+    @cached_dataset("test_years")
     def test_data_for_abstracts(self,which="small"):
-        self.test_data(which).abstracts()
+        self._intern().test_query(which).columns("chapter_abstract").load().conferences().conferenceseries()
         self.data = self.data[["chapter_abstract","conferenceseries"]].copy()
         self.data.drop(
             list(self.data[pd.isnull(self.data.chapter_abstract)].index),
             inplace=True
         )
-        self.data.chapter_abstract = self.data.chapter_abstract.str.decode("unicode_escape")
         self.data = self.data.reset_index()
         self.data = self.data[["chapter_abstract","conferenceseries"]]
         
+        self.resolve()
+        
         return self
     
     ######################################
     # Get training data for keyword models.
+    @cached_dataset("test_years")
     def test_data_for_keywords(self,which="small"):
-        self.test_data(which).keywords()
-        
-        self.data.keyword = self.data.keyword.str.replace("<http://scigraph.springernature.com/things/product-market-codes/","")
-        self.data.keyword = self.data.keyword.str[0:-1]
-        
-        self.data = self.data[["chapter","keyword","conferenceseries"]].copy()
-        self.data.drop(
-            list(self.data[pd.isnull(self.data.keyword)].index),
-            inplace=True
-        )
+        self._intern().test_data(which).keywords()
         
-        conferenceseries = self.data[["chapter","conferenceseries"]].drop_duplicates()
-        self.data.keyword = self.data.keyword + " "
-        self.data = pd.merge(
-                self.data.groupby("chapter").sum().reset_index()[["chapter","keyword"]],
-                conferenceseries,
-                how="outer",
-                on="chapter"
-        )
+        self.keyword_bags()
         
         #self.data.chapter_abstract = self.data.chapter_abstract.str.decode("unicode_escape")
         self.data = self.data.reset_index()
         self.data = self.data[["chapter","keyword","conferenceseries"]]
         
+        self.resolve(sort="chapter")
+        
         return self
     
     ######################################
     # Get training data for combined abstracts+keywords models.
+    @cached_dataset("test_years")
     def test_data_for_abstracts_and_keywords(self,which="small"):
-        self.test_data(which).keywords()
+        self._intern().test_data(which).keywords()
         
         # Preprocess keywords.
         
-        self.data.keyword = self.data.keyword.str.replace("<http://scigraph.springernature.com/things/product-market-codes/","")
-        self.data.keyword = self.data.keyword.str[0:-1]
-        
-        self.data = self.data[["chapter","keyword","conferenceseries"]].copy()
-        self.data.drop(
-            list(self.data[pd.isnull(self.data.keyword)].index),
-            inplace=True
-        )
-        
-        conferenceseries = self.data[["chapter","conferenceseries"]].drop_duplicates()
-        self.data.keyword = self.data.keyword + " "
-        self.data = pd.merge(
-                self.data.groupby("chapter").sum().reset_index()[["chapter","keyword"]],
-                conferenceseries,
-                how="outer",
-                on="chapter"
-        )
+        self.keyword_bags()
         
         # Preprocess abstracts.
         
@@ -537,11 +705,12 @@ class DataLoader:
             list(self.data[pd.isnull(self.data.chapter_abstract)].index),
             inplace=True
         )
-        self.data.chapter_abstract = self.data.chapter_abstract.str.decode("unicode_escape")
         
         self.data = self.data.reset_index()
         self.data = self.data[["chapter","chapter_abstract","keyword","conferenceseries"]]
         
+        self.resolve(sort="chapter")
+        
         return self
     
     ######################################
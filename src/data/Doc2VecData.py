@@ -71,7 +71,7 @@ class Doc2VecData():
             print("Preprocessing abstracts.")
             self.timer.tic()
             self.training_data = list(
-                    self.d.data["chapter_abstract"].str.lower().str.decode("unicode_escape"))
+                    self.d.data["chapter_abstract"].str.lower())
             self.timer.toc()
 
             self.training_data = self._abstractToLine()
@@ -49,41 +49,33 @@ class EmbeddingsData():
         else:
             print("Training data not on disk.")
             os.mkdir(self.filepath)
-            print("Loading and preprocessing training data.")
-            
-            self.timer.tic()
-            print("Loading SciGraph.")
-            self.d = SciGraphLoader()    
-            self.d.training_data(data_which).abstracts()
-        
-            self.timer.toc()
-            
-            # drop empty abstracts
-            self.d.data.drop(
-                list(self.d.data[pd.isnull(self.d.data.chapter_abstract)].index),
-                inplace=True
-            )
-            self.d.data.reset_index(inplace=True)
-                    
-            
-            print("Preprocessing abstracts.")
-            self.timer.tic()
-            self.training_data = list(
-                    self.d.data["chapter_abstract"].str.lower().str.decode("unicode_escape"))
-            self.timer.toc()
-
-            print("Transforming and saving abstracts.")
+            print("Loading, preprocessing and saving training data.")
             self.timer.tic()
             
-            self.training_data = self._sentenceToLine()
+            # stream the abstracts year by year instead of loading them all
+            self.d = SciGraphLoader()
+            self.training_data = list()
+            count_abstracts = 0
+            count_lines = 0
             file = os.path.join(self.filepath, "abstracts.gz")
             with gzip.open(file, "wb") as f:
-                f.writelines(sentence.encode("utf-8") for sentence in self.training_data)
-
+                for chunk in self.d.iter_training_data(data_which, fields=("abstracts",)):
+                    # drop empty abstracts
+                    chunk = chunk[pd.notnull(chunk.chapter_abstract)]
+                    self.training_data = list(
+                            chunk["chapter_abstract"].str.lower())
+                    lines = self._sentenceToLine()
+                    f.writelines(sentence.encode("utf-8") for sentence in lines)
+                    count_abstracts += len(self.training_data)
+                    count_lines += len(lines)
+            
+            print("Finished transforming {} abstracts with {} lines.".format(
+                    count_abstracts, count_lines))
             print("... total time:")
             self.timer.toc() 
             
             del self.d   
+            del self.training_data
             
     def _sentenceToLine(self):
         """
@@ -93,17 +85,10 @@ class EmbeddingsData():
             text[list]: list with the processed sentences of the abstracts
         """
         text = list()
-        count_lines = 0
         
         for abstract in self.training_data:
-            line = 0
             for sentence in sent_tokenize(abstract):
                 text.append(sentence.rstrip(".") + "\n")
-                line += 1
-            count_lines += line
-            
-        print("Finished transforming {} abstracts with {} lines.".format(
-                len(self.training_data), count_lines))
                 
         return text
     
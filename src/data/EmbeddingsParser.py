@@ -7,11 +7,74 @@ Created on Fri Jul 13 20:30:27 2018
 """
 
 import os
+import pickle
+import hashlib
+import threading
 from gensim.models.keyedvectors import KeyedVectors
-from sklearn.feature_extraction.text import TfidfVectorizer
-from collections import defaultdict
 import spacy
 import numpy as np
+from scipy.sparse import csr_matrix
+import multiprocessing as mp
+from FileParser import FileParser, Embeddings
+
+class TokenIds:
+    """
+    Token ids of a list of sentences as a ragged array: the ids of all tokens in one
+    flat int32 array and the offsets of the sentences in it (one more than sentences).
+    Indexing with a slice or an array of rows returns the TokenIds of those rows.
+    """
+    
+    def __init__(self,ids,offsets):
+        self.ids = ids
+        self.offsets = offsets
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self,rows):
+        if isinstance(rows,slice):
+            start, stop, step = rows.indices(len(self))
+            if step == 1:
+                stop = max(start,stop)
+                offsets = self.offsets[start:stop+1]
+                return TokenIds(self.ids[offsets[0]:offsets[-1]], offsets - offsets[0])
+            rows = np.arange(start,stop,step)
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows+1] - starts
+        offsets = np.zeros(len(rows)+1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1],lengths)
+        return TokenIds(self.ids[positions], offsets)
+    
+    def lengths(self):
+        return np.diff(self.offsets)
+    
+    def save(self,file):
+        # both files are renamed once complete, the offsets last as their file marks a complete entry
+        for name, array in [("ids",self.ids),("offsets",self.offsets)]:
+            np.save(file + "." + name + ".part.npy", array)
+            os.replace(file + "." + name + ".part.npy", file + "." + name + ".npy")
+    
+    @staticmethod
+    def load(file):
+        return TokenIds(
+                np.load(file + ".ids.npy", mmap_mode="r"),
+                np.load(file + ".offsets.npy", mmap_mode="r")
+        )
+
+class _TensorLease:
+    """
+    The reused tensors a thread holds per shape. When the thread ends, they are
+    handed back to the pool of the parser for the next thread.
+    """
+    
+    def __init__(self,parser):
+        self.parser = parser
+        self.tensors = {}
+    
+    def __del__(self):
+        self.parser._release_tensors(self.tensors.items())
 
 class EmbeddingsParser:
 
@@ -36,60 +99,35 @@ class EmbeddingsParser:
     paths = {
             "6d50":os.path.join(path_pretrained_embeddings,"glove.6B.50d.txt"),
             "6d50-w2v":os.path.join(path_pretrained_embeddings,"glove.6B.50d-w2v.txt"),
-            "6d50-folder":os.path.join(path_pretrained_embeddings,"glove.6B.50d-spacy",""),
             "6d100":os.path.join(path_pretrained_embeddings,"glove.6B.100d.txt"),
             "6d100-w2v":os.path.join(path_pretrained_embeddings,"glove.6B.100d-w2v.txt"),
-            "6d100-folder":os.path.join(path_pretrained_embeddings,"glove.6B.100d-spacy",""),
             "6d200":os.path.join(path_pretrained_embeddings,"glove.6B.200d.txt"),
             "6d200-w2v":os.path.join(path_pretrained_embeddings,"glove.6B.200d-w2v.txt"),
-            "6d200-folder":os.path.join(path_pretrained_embeddings,"glove.6B.200d-spacy",""),
             "6d300":os.path.join(path_pretrained_embeddings,"glove.6B.300d.txt"),
             "6d300-w2v":os.path.join(path_pretrained_embeddings,"glove.6B.300d-w2v.txt"),
-            "6d300-folder":os.path.join(path_pretrained_embeddings,"glove.6B.300d-spacy",""),
             "42d300":os.path.join(path_pretrained_embeddings,"glove.42B.300d.txt"),
             "42d300-w2v":os.path.join(path_pretrained_embeddings,"glove.42B.300d-w2v.txt"),
-            "42d300-folder":os.path.join(path_pretrained_embeddings,"glove.42B.300d-spacy",""),
             "840d300":os.path.join(path_pretrained_embeddings,"glove.840B.300d.txt"),
             "840d300-w2v":os.path.join(path_pretrained_embeddings,"glove.840B.300d-w2v.txt"),
-            "840d300-folder":os.path.join(path_pretrained_embeddings,"glove.840B.300d-spacy",""),
             "word2vec-w2v":os.path.join(path_pretrained_embeddings,"GoogleNews-vectors-negative300.bin"),
-            "word2vec-folder":os.path.join(path_pretrained_embeddings,"word2vec-spacy",""),
             "fasttext-w2v": os.path.join(path_pretrained_embeddings, "wiki-news-300d-1M.vec"),
-            "fasttext-folder":os.path.join(path_pretrained_embeddings, "fasttext-spacy",""),
             "w2v_50d_w5_CBOW_HS-w2v":os.path.join(path_embeddings, "w2v_50d_w5_CBOW_HS.bin"),
-            "w2v_50d_w5_CBOW_HS-folder":os.path.join(path_embeddings, "w2v_50d_w5_CBOW_HS-spacy",""),
             "w2v_50d_w5_CBOW_NS-w2v":os.path.join(path_embeddings, "w2v_50d_w5_CBOW_NS.bin"),
-            "w2v_50d_w5_CBOW_NS-folder":os.path.join(path_embeddings, "w2v_50d_w5_CBOW_NS-spacy",""),
             "w2v_50d_w10_SG_HS-w2v":os.path.join(path_embeddings, "w2v_50d_w10_SG_HS.bin"),
-            "w2v_50d_w10_SG_HS-folder":os.path.join(path_embeddings, "w2v_50d_w10_SG_HS-spacy",""),
             "w2v_50d_w10_SG_NS-w2v":os.path.join(path_embeddings, "w2v_50d_w10_SG_NS.bin"),
-            "w2v_50d_w10_SG_NS-folder":os.path.join(path_embeddings, "w2v_50d_w10_SG_NS-spacy",""),
             "w2v_100d_w10_SG_NS-w2v":os.path.join(path_embeddings, "w2v_100d_w10_SG_NS.bin"),
-            "w2v_100d_w10_SG_NS-folder":os.path.join(path_embeddings, "w2v_100d_w10_SG_NS-spacy",""),
             "w2v_100d_w10_SG_HS-w2v":os.path.join(path_embeddings, "w2v_100d_w10_SG_HS.bin"),
-            "w2v_100d_w10_SG_HS-folder":os.path.join(path_embeddings, "w2v_100d_w10_SG_HS-spacy",""),
             "w2v_150d_w10_SG_NS-w2v":os.path.join(path_embeddings, "w2v_150d_w10_SG_NS.bin"),
-            "w2v_150d_w10_SG_NS-folder":os.path.join(path_embeddings, "w2v_150d_w10_SG_NS-spacy",""),
             "w2v_300d_w10_SG_NS-w2v":os.path.join(path_embeddings, "w2v_300d_w10_SG_NS.bin"),
-            "w2v_300d_w10_SG_NS-folder":os.path.join(path_embeddings, "w2v_300d_w10_SG_NS-spacy",""),
             "ft_50d_w2_CBOW_HS-w2v":os.path.join(path_embeddings, "ft_50d_w2_CBOW_HS.bin"),
-            "ft_50d_w2_CBOW_HS-folder":os.path.join(path_embeddings, "ft_50d_w2_CBOW_HS-spacy",""),
             "ft_50d_w2_CBOW_NS-w2v":os.path.join(path_embeddings, "ft_50d_w2_CBOW_NS.bin"),
-            "ft_50d_w2_CBOW_NS-folder":os.path.join(path_embeddings, "ft_50d_w2_CBOW_NS-spacy",""),
             "ft_50d_w2_SG_HS-w2v":os.path.join(path_embeddings, "ft_50d_w2_SG_HS.bin"),
-            "ft_50d_w2_SG_HS-folder":os.path.join(path_embeddings, "ft_50d_w2_SG_HS-spacy",""),
             "ft_50d_w2_SG_NS-w2v":os.path.join(path_embeddings, "ft_50d_w2_SG_NS.bin"),
-            "ft_50d_w2_SG_NS-folder":os.path.join(path_embeddings, "ft_50d_w2_SG_NS-spacy",""),
             "ft_50d_w3_SG_NS-w2v":os.path.join(path_embeddings, "ft_50d_w3_SG_NS.bin"),
-            "ft_50d_w3_SG_NS-folder":os.path.join(path_embeddings, "ft_50d_w3_SG_NS-spacy",""),
             "ft_50d_w4_SG_NS-w2v":os.path.join(path_embeddings, "ft_50d_w4_SG_NS.bin"),
-            "ft_50d_w4_SG_NS-folder":os.path.join(path_embeddings, "ft_50d_w4_SG_NS-spacy",""),
             "ft_50d_w5_SG_NS-w2v":os.path.join(path_embeddings, "ft_50d_w5_SG_NS.bin"),
-            "ft_50d_w5_SG_NS-folder":os.path.join(path_embeddings, "ft_50d_w5_SG_NS-spacy",""),
             "ft_100d_w5_SG_NS-w2v":os.path.join(path_embeddings, "ft_100d_w5_SG_NS.bin"),
-            "ft_100d_w5_SG_NS-folder":os.path.join(path_embeddings, "ft_100d_w5_SG_NS-spacy",""),
-            "ft_150d_w5_SG_NS-w2v":os.path.join(path_embeddings, "ft_150d_w5_SG_NS.bin"),
-            "ft_150d_w5_SG_NS-folder":os.path.join(path_embeddings, "ft_150d_w5_SG_NS-spacy","")            
+            "ft_150d_w5_SG_NS-w2v":os.path.join(path_embeddings, "ft_150d_w5_SG_NS.bin")
     }
     
     pretrained_models = [
@@ -103,6 +141,16 @@ class EmbeddingsParser:
             "fasttext"
     ]
     
+    # models read from the GloVe text files by the FileParser
+    glove_models = [
+            "6d50",
+            "6d100",
+            "6d200",
+            "6d300",
+            "42d300",
+            "840d300"
+    ]
+    
     lengths = {
             "6d50":50,
             "6d100":100,
@@ -131,12 +179,81 @@ class EmbeddingsParser:
             "ft_150d_w5_SG_NS":150
     }
     
+    # embedding stores loaded in this process
     models = {}
     
+    # cached token ids of sentence lists, see token_ids
+    path_token_ids = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)),
+            "..",
+            "..",
+            "data",
+            "interim",
+            "token_ids"
+    )
+    
+    # bump when the tokenization changes
+    token_ids_version = 1
+    
+    # smaller lists of sentences (e.g. queries) are tokenized without cache
+    cache_min_sentences = 10000
+    
+    # fixed size tensors kept per thread and free in the pool, see transform_tensor_to_fixed_size
+    max_tensor_buffers = 4
+    
+    def __init__(self,workers=1,chunk_size=1000,cache=True,allocator=None):
+        # processes tokenizing the sentences of the batch transforms
+        self.workers = workers
+        # sentences per task of a worker
+        self.chunk_size = chunk_size
+        # read the token ids of large batch transforms from the cache
+        self.cache = cache
+        # allocates reused float32 tensors for a shape, e.g. in pinned memory (default: numpy)
+        self.allocator = allocator
+        # reused tensors held by each thread (see _TensorLease) and free ones of ended threads
+        self.tensor_leases = threading.local()
+        self.tensor_pool = []
+        self.tensor_lock = threading.Lock()
+    
     #################################################
     @staticmethod
     def _get_keyed_vectors(model,binary):
         return KeyedVectors.load_word2vec_format(EmbeddingsParser.paths[model + "-w2v"], binary=binary)
+    
+    #################################################
+    @staticmethod
+    def _get_embeddings(model):
+        """
+        Returns the embedding store of a model: the vocabulary (word -> row) and a
+        float32 matrix that is memory mapped, so processes share its pages.
+        GloVe models are read by the FileParser, other models are converted from
+        the word2vec format once and stored next to it.
+        
+        Args:
+            model (str): The model used.
+            
+        Returns:
+            FileParser.Embeddings: the store.
+        """
+        if model in EmbeddingsParser.glove_models:
+            return FileParser().getData("glove." + model)
+        
+        file = os.path.splitext(EmbeddingsParser.paths[model + "-w2v"])[0]
+        if os.path.isfile(file + ".npy") and os.path.isfile(file + ".vocab.pkl"):
+            with open(file + ".vocab.pkl","rb") as f:
+                return Embeddings(file + ".npy", pickle.load(f))
+        
+        print("Embedding store not present, generating it.")
+        keyed_vectors = EmbeddingsParser._get_keyed_vectors(model, model != "fasttext")
+        try:
+            words = keyed_vectors.index_to_key
+        except AttributeError:
+            words = keyed_vectors.index2word
+        np.save(file + ".npy", keyed_vectors.vectors.astype(np.float32, copy=False))
+        index = {word:i for i, word in enumerate(words)}
+        with open(file + ".vocab.pkl","wb") as f:
+            pickle.dump(index, f)
+        return Embeddings(file + ".npy", index)
         
     #################################################
     def load_model(self, model, pretrained=True):
@@ -150,56 +267,195 @@ class EmbeddingsParser:
             
             pretrained(bool): Whether the used embeddings are pretrained or not.
         """
-        pretrained = model in self.pretrained_models
+        try:
+            self.embeddings = self.models[model]
+        except KeyError:
+            self.embeddings = self.models[model] = EmbeddingsParser._get_embeddings(model)
+        self.length = self.lengths[model]
+        self.model = model
+        
+        # the tokenizer of the spacy English model
+        self.nlp = spacy.blank("en")
+    
+    #################################################
+    def _batches(self,sentences,batch_size):
+        """
+        Tokenizes the sentences and yields them in lists of at most batch_size docs.
+        """
+        docs = list()
+        for doc in self.nlp.tokenizer.pipe(sentences, batch_size=batch_size):
+            docs.append(doc)
+            if len(docs) == batch_size:
+                yield docs
+                docs = list()
+        if len(docs) > 0:
+            yield docs
+    
+    #################################################
+    def _token_ids(self,docs):
+        """
+        Maps the tokens of a list of docs to rows of the embedding matrix.
+        
+        Returns:
+            numpy.ndarray: the rows of all tokens, -1 for tokens not in the vocabulary.
+            numpy.ndarray: the number of tokens of each doc.
+        """
+        index = self.embeddings.index
+        ids = np.fromiter((index.get(w.text,-1) for doc in docs for w in doc), dtype=np.int32)
+        lengths = np.fromiter((len(doc) for doc in docs), dtype=np.int64, count=len(docs))
+        return ids, lengths
+    
+    #################################################
+    def _token_batches(self,sentences,batch_size):
+        """
+        Yields the token ids and lengths (see _token_ids) of consecutive batches of
+        the sentences, in their order. "sentences" can also be TokenIds. Lists of at
+        least cache_min_sentences sentences are read from the token id cache.
+        """
+        if not isinstance(sentences,TokenIds):
+            if not self.cache or len(sentences) < self.cache_min_sentences:
+                yield from self._tokenize(sentences,batch_size)
+                return
+            sentences = self.token_ids(sentences,batch_size)
+        
+        for start in range(0,len(sentences),batch_size):
+            batch = sentences[start:start+batch_size]
+            yield np.asarray(batch.ids), batch.lengths()
+    
+    #################################################
+    def _tokenize(self,sentences,batch_size):
+        """
+        Tokenizes the sentences and yields the token ids and lengths (see _token_ids) of
+        consecutive batches of batch_size sentences, in the order of the sentences.
+        With more than one worker, chunks of chunk_size sentences are tokenized by
+        a pool of processes which send back only the token ids. Their results are
+        cut into batches of batch_size sentences again.
+        """
+        if self.workers <= 1:
+            for docs in self._batches(sentences,batch_size):
+                yield self._token_ids(docs)
+            return
         
+        sentences = list(sentences)
+        tasks = [
+                (sentences[i:i+self.chunk_size], batch_size)
+                for i in range(0, len(sentences), self.chunk_size)
+        ]
+        pool = mp.Pool(
+                processes=self.workers,
+                initializer=_init_tokenizer,
+                initargs=(self.model,)
+        )
         try:
-            self.nlp = spacy.load(self.paths[model + "-folder"])
-            self.length = self.lengths[model]
-            
-        except OSError:
-            if not os.path.isfile(self.paths[model + "-w2v"]) and pretrained:
-                from gensim.scripts.glove2word2vec import glove2word2vec
-                print("Word2Vec format not present, generating it.")
-                glove2word2vec(glove_input_file=self.paths[model], word2vec_output_file=self.paths[model + "-w2v"])
-                        
-            try:
-                self.current_model = self.models[model + "-w2v"]
-                self.length = self.lengths[model]
-            except KeyError:
-                if pretrained:
-                    if model == "fasttext":
-                        print("FastText not loaded yet, loading it.")
-                        binary = False
-                    elif model == "word2vec":
-                        print("Word2Vec not loaded yet, loading it.")
-                        binary = True
-                    else:
-                        print("Glove not loaded yet, loading it.")
-                        binary = False
-                else:
-                    print("Model not loaded yet, loading it.")
-                    binary = True
-                
-                self.models[model + "-w2v"] = EmbeddingsParser._get_keyed_vectors(model,binary)
-                self.current_model = self.models[model + "-w2v"]
-                self.length = self.lengths[model]
-            
-            print("Setting up spacy vocab.")
-            
-            self.nlp = spacy.load("en", vectors=False)
-            
-            count = 0
-            for word, o in self.current_model.vocab.items():
-                count += 1
-                self.nlp.vocab.set_vector(word, self.current_model[word])
-            
-            print("Done ({}). Saving to disk.".format(count))
+            # sentences of the last chunk not yielded yet
+            rest = TokenIds(np.zeros(0, dtype=np.int32), np.zeros(1, dtype=np.int64))
+            for ids, lengths in pool.imap(_tokenize_chunk,tasks):
+                lengths = np.concatenate((rest.lengths(), lengths))
+                tokens = TokenIds(
+                        np.concatenate((rest.ids, ids)),
+                        np.concatenate(([0],np.cumsum(lengths))).astype(np.int64)
+                )
+                full = len(tokens) - len(tokens) % batch_size
+                for start in range(0,full,batch_size):
+                    batch = tokens[start:start+batch_size]
+                    yield batch.ids, batch.lengths()
+                rest = tokens[full:]
+            if len(rest) > 0:
+                yield rest.ids, rest.lengths()
+        finally:
+            pool.terminate()
+    
+    #################################################
+    def token_ids(self,sentences,batch_size=100,source=None):
+        """
+        Returns the token ids of the sentences from the token id cache, tokenizing
+        them first if they are not cached yet. Entries are keyed by the sentences,
+        the tokenizer and the vocabulary of the loaded model, so all models using
+        the same embeddings share them.
+        Finding the entry of the sentences hashes all of them, i.e. reads the whole
+        corpus once per call. Callers that read the sentences from a file pass it
+        as source instead, the entry is then keyed by its path, size and time.
+        
+        Args:
+            sentences list(str): The list of strings to be tokenized.
+            source (str): A file the sentences were read from as they are.
             
-            try:
-                self.nlp.to_disk(self.paths[model + "-folder"])
-            except FileNotFoundError:
-                os.mkdir(self.paths[model + "-folder"])
-                self.nlp.to_disk(self.paths[model + "-folder"])
+        Returns:
+            TokenIds: the token ids of each sentence, memory mapped.
+        """
+        file = os.path.join(self.path_token_ids,self._token_ids_key(sentences,source))
+        if os.path.isfile(file + ".offsets.npy"):
+            return TokenIds.load(file)
+        
+        print("Token ids not cached yet, tokenizing.")
+        ids = list()
+        lengths = list()
+        for batch_ids, batch_lengths in self._tokenize(sentences,batch_size):
+            ids.append(batch_ids)
+            lengths.append(batch_lengths)
+        lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+        tokens = TokenIds(
+                np.concatenate(ids) if ids else np.zeros(0, dtype=np.int32),
+                np.concatenate(([0],np.cumsum(lengths))).astype(np.int64)
+        )
+        
+        os.makedirs(self.path_token_ids, exist_ok=True)
+        tokens.save(file)
+        return TokenIds.load(file)
+    
+    #################################################
+    def _token_ids_key(self,sentences,source=None):
+        """
+        Key of the cached token ids of the sentences (read from the file source).
+        """
+        key = hashlib.sha1()
+        stat = os.stat(self.embeddings.file)
+        key.update(repr((
+                self.token_ids_version,
+                spacy.__version__,
+                self.nlp.lang,
+                self.model,
+                len(self.embeddings),
+                stat.st_size,
+                stat.st_mtime
+        )).encode())
+        if source is not None:
+            stat = os.stat(source)
+            key.update(repr((
+                    os.path.realpath(source),
+                    stat.st_size,
+                    stat.st_mtime,
+                    len(sentences)
+            )).encode())
+            return key.hexdigest()
+        for sentence in sentences:
+            sentence = sentence.encode("utf8")
+            key.update(len(sentence).to_bytes(8,"little"))
+            key.update(sentence)
+        return key.hexdigest()
+    
+    #################################################
+    def _gather(self,ids):
+        """
+        Returns the embeddings of token ids as rows of a matrix, in a single lookup.
+        Tokens not in the vocabulary get zeros.
+        """
+        rows = self.embeddings.getVectors()[np.maximum(ids,0)]
+        rows[ids < 0] = 0
+        return rows
+    
+    #################################################
+    @staticmethod
+    def _segment_sums(rows,lengths):
+        """
+        Sums consecutive rows per doc of the given lengths. Empty docs get zeros.
+        """
+        sums = np.zeros((len(lengths),rows.shape[1]))
+        nonempty = lengths > 0
+        if len(rows) > 0:
+            starts = np.cumsum(lengths) - lengths
+            sums[nonempty] = np.add.reduceat(rows,starts[nonempty],axis=0)
+        return sums
     
     #################################################    
     def transform_matrix(self,sentence):
@@ -212,13 +468,8 @@ class EmbeddingsParser:
         Returns:
             A numpy matrix that contains word embeddings as rows of each word given by "sentence".
         """
-        for w in self.nlp(sentence):
-            try:
-                m = np.concatenate((m,[w.vector]),axis=0)
-            except NameError:
-                m = np.array([w.vector])
-            
-        return m
+        ids, lengths = self._token_ids([self.nlp(sentence)])
+        return self._gather(ids)
     
     #################################################
     def transform_vector(self,sentence):
@@ -231,14 +482,7 @@ class EmbeddingsParser:
         Returns:
             A numpy array that contains concatenated word embeddings for each word given by "sentence".
         """
-        
-        for w in self.nlp(sentence):
-            try:
-                m = np.append(m,w.vector)
-            except NameError:
-                m = np.array(w.vector)
-            
-        return m
+        return self.transform_matrix(sentence).ravel()
     
     #################################################
     def transform_vectors(self,sentences,batch_size=100):
@@ -253,39 +497,95 @@ class EmbeddingsParser:
         """
         
         vectors = list()
-        for doc in self.nlp.tokenizer.pipe(sentences, batch_size=batch_size):
-            m = np.empty(len(doc)*self.length)
-            for i, w in enumerate(doc):
-                m[(i*self.length):((i+1)*self.length)] = w.vector
-            vectors.append(m)
+        for ids, lengths in self._token_batches(sentences,batch_size):
+            rows = self._gather(ids).astype(np.float64).ravel()
+            vectors.extend(np.split(rows,np.cumsum(lengths)[:-1]*self.length))
             
         return vectors
     
     #################################################
-    def transform_tensor_to_fixed_size(self,sentences,embeddings_size,spatial_size,batch_size=100):
+    def transform_tensor_to_fixed_size(self,sentences,embeddings_size,spatial_size,batch_size=100,reuse=False):
         """
         Transform a list of strings into a tensor of fixed size containing word embeddings.
         
         Args:
             sentences list(str): The list of strings to be transformed.
-            vector_size(int): 
+            embeddings_size (int): The length of the word embeddings.
+            spatial_size (int): The number of words kept per string.
+            reuse (bool): Write into a preallocated tensor that is kept for this shape
+                          and overwritten by the next call of the same thread with the same shape.
             
         Returns:
-            A list of numpy arrays that contain concatenated word embeddings for each word given by "sentence".
+            A float32 array of shape (len(sentences),embeddings_size,spatial_size) with the
+            word embeddings of the first spatial_size words of each string, zero padded.
         """
-        tensor = np.zeros(
-                (len(sentences),embeddings_size,spatial_size),
-                dtype=np.float32
-        )
+        shape = (len(sentences),embeddings_size,spatial_size)
+        if reuse:
+            tensor = self._tensor_buffer(shape)
+        else:
+            tensor = np.zeros(shape,dtype=np.float32)
         
-        for i_batch, doc in enumerate(self.nlp.tokenizer.pipe(sentences, batch_size=batch_size)):
-            for i_word, word in enumerate(doc):
-                if i_word >= spatial_size:
-                    break
-                tensor[i_batch,:,i_word] = word.vector
+        i_batch = 0
+        for ids, lengths in self._token_batches(sentences,batch_size):
+            # token positions of the first spatial_size tokens of each doc
+            docs_index = np.repeat(np.arange(len(lengths)),lengths)
+            words_index = np.arange(len(ids)) - np.repeat(np.cumsum(lengths) - lengths,lengths)
+            keep = words_index < spatial_size
+            tensor[docs_index[keep] + i_batch,:,words_index[keep]] = self._gather(ids[keep])
+            i_batch += len(lengths)
             
         return tensor
     
+    #################################################
+    def _tensor_buffer(self,shape):
+        """
+        Returns the zeroed tensor the calling thread holds for a shape. A thread
+        takes a tensor of that shape from the pool of ended threads or allocates
+        one on first use, so concurrent queries never share a tensor.
+        """
+        lease = getattr(self.tensor_leases,"lease",None)
+        if lease is None:
+            lease = self.tensor_leases.lease = _TensorLease(self)
+        tensor = lease.tensors.get(shape)
+        if tensor is None:
+            if len(lease.tensors) >= self.max_tensor_buffers:
+                # hand back the oldest shape
+                oldest = next(iter(lease.tensors))
+                self._release_tensors([(oldest,lease.tensors.pop(oldest))])
+            with self.tensor_lock:
+                for i, (free_shape, free) in enumerate(self.tensor_pool):
+                    if free_shape == shape:
+                        tensor = self.tensor_pool.pop(i)[1]
+                        break
+            if tensor is None:
+                if self.allocator is None:
+                    tensor = np.empty(shape,dtype=np.float32)
+                else:
+                    tensor = self.allocator(shape)
+            lease.tensors[shape] = tensor
+        tensor.fill(0)
+        return tensor
+    
+    #################################################
+    def _release_tensors(self,tensors):
+        """
+        Puts tensors no thread holds anymore into the pool, which keeps the
+        max_tensor_buffers most recently released ones.
+        """
+        with self.tensor_lock:
+            self.tensor_pool.extend(tensors)
+            del self.tensor_pool[:-self.max_tensor_buffers]
+    
+    #################################################
+    @staticmethod
+    def pinned_tensor(shape):
+        """
+        Allocator for tensors in page-locked memory, which is copied to the GPU faster.
+        Needs torch with CUDA.
+        """
+        import torch
+        return torch.zeros(shape,dtype=torch.float32).pin_memory().numpy()
+    
     #################################################
     def transform_avg_vectors(self,sentences,batch_size=100):
         """
@@ -299,15 +599,13 @@ class EmbeddingsParser:
         """
         
         vectors = list()
-        for doc in self.nlp.tokenizer.pipe(sentences, batch_size=batch_size):
-            m = np.empty(self.length)
-            for i, w in enumerate(doc):
-                m = np.add(m,w.vector)
-            vectors.append(m/len(doc))
+        for ids, lengths in self._token_batches(sentences,batch_size):
+            sums = self._segment_sums(self._gather(ids).astype(np.float64),lengths)
+            vectors.extend(sums/np.maximum(lengths,1)[:,None])
             
         return vectors
        
-      ################################################
+    ################################################
     def transform_tfidf_avg_vectors(self, sentences, tfidf_weights, batch_size = 100):
         """
         Transform a list of strings into a list of vectors containing averaged
@@ -315,55 +613,72 @@ class EmbeddingsParser:
         
         Args:
             sentence list(str): The list of strings to be transformed.
+            tfidf_weights (numpy.ndarray): The idf of each word of the vocabulary
+                                           as returned by compute_tfidf_weights.
             
         Returns:
             A list of numpy arrays that contain averaged wieghted 
             word embeddings for each word given by "sentence".
         """
         vectors = list()
-        max_weight = max(tfidf_weights.values())
+        # words without embedding get the weight of the rarest word
+        max_weight = tfidf_weights.max()
         
-        for doc in self.nlp.tokenizer.pipe(sentences, batch_size=batch_size):
-            m = np.empty(self.length)
-            sum_weights = 0
-            for i, w in enumerate(doc):
-                if w in tfidf_weights.keys():
-                    weight = tfidf_weights[w]
-                else:
-                    weight = max_weight 
-                sum_weights += weight
-                m = np.add(m, np.multiply(w.vector, weight))
-            vectors.append(m/sum_weights)
+        for ids, lengths in self._token_batches(sentences,batch_size):
+            docs_index = np.repeat(np.arange(len(lengths)),lengths)
+            known = ids >= 0
+            weights = np.full(len(ids), max_weight)
+            weights[known] = tfidf_weights[ids[known]]
+            
+            # docs x words of the batch, weighted by term frequency and idf
+            words, columns = np.unique(ids[known], return_inverse=True)
+            tfidf = csr_matrix(
+                    (weights[known], (docs_index[known], columns)),
+                    shape=(len(lengths), len(words))
+            )
+            sums = tfidf @ self.embeddings.getVectors()[words].astype(np.float64)
+            sum_weights = np.bincount(docs_index, weights, minlength=len(lengths))
+            vectors.extend(sums/np.maximum(sum_weights,np.finfo(np.float64).tiny)[:,None])
             
         return vectors
        
     #################################################
-    def compute_tfidf_weights(self, sentences):
+    def compute_tfidf_weights(self, sentences, batch_size=100):
         """
-        Calculate the TFIDF weights of a list of documents.
+        Calculate the inverse document frequencies of the words of the embedding
+        vocabulary over a list of documents.
         
         Args:
-            sentence list(str): The list of strings for which the TFIDF is to 
+            sentence list(str): The list of strings for which the IDF is to 
                                 be computed.
             
         Returns:
-            A dictionary (token, tfidf_score) containing the tfidf score 
-            for each token in the "sentence".
-        """
-        tfidf = TfidfVectorizer(
-                min_df = 0,
-                max_df = 1.0,
-                ) 
-        tr_sentences = tfidf.fit_transform(sentences)
-        feature_names = tfidf.get_feature_names()
-        feature_index = tr_sentences.nonzero()[1]
-        tfidf_scores = zip(feature_index, [tr_sentences[0, x] for x in feature_index])
-        tfidf_weights = defaultdict(
-                None,
-                [(word, score) for word, score in [(feature_names[i], s) for (i, s) in tfidf_scores]]
-                )
+            A numpy array with the smoothed idf (as in sklearn's TfidfVectorizer)
+            of each row of the embedding matrix.
+        """
+        words = self.embeddings.getVectors().shape[0]
+        frequencies = np.zeros(words, dtype=np.int64)
+        documents = 0
         
-        return tfidf_weights
+        for ids, lengths in self._token_batches(sentences,batch_size):
+            docs_index = np.repeat(np.arange(len(lengths)),lengths)
+            known = ids >= 0
+            # each word once per document
+            pairs = np.unique(docs_index[known]*words + ids[known])
+            frequencies += np.bincount(pairs % words, minlength=words)
+            documents += len(lengths)
+        
+        return np.log((1 + documents)/(1 + frequencies)) + 1
+        
+# Tokenizer of a worker process of EmbeddingsParser._token_batches.
+def _init_tokenizer(model):
+    global _tokenizer
+    _tokenizer = EmbeddingsParser()
+    _tokenizer.load_model(model)
+
+def _tokenize_chunk(task):
+    sentences, batch_size = task
+    return _tokenizer._token_ids(list(_tokenizer.nlp.tokenizer.pipe(sentences, batch_size=batch_size)))
         
 ## Example:
 #parser = EmbeddingsParser()
@@ -20,8 +20,21 @@ Book
 
 import pickle
 import os.path
+import hashlib
+import json
+import io
+import gzip
+import bz2
+import subprocess
+import contextlib
+import copy
+import shutil
 import re
 import time
+import multiprocessing as mp
+import pandas as pd
+import numpy as np
+from collections.abc import MutableSet, Mapping
 from urllib.parse import unquote
 
 ### shared attributes
@@ -61,9 +74,245 @@ cso_eq = "<http://kmi.open.ac.uk/projects/rexplore/ontologies/BiboExtension#rela
 cso_parent = "<http://www.w3.org/2004/02/skos/core#broaderGeneric>"
 cso_label = "<http://kmi.open.ac.uk/projects/rexplore/ontologies/BiboExtension#primaryLabel>"
 
+class OrderedSet(MutableSet):
+    """
+        Set of entities that keeps the order in which they were added.
+        Used for entity lists so membership tests are O(1).
+    """
+    def __init__(self,iterable=()):
+        self.items = dict.fromkeys(iterable)
+
+    def __contains__(self,x):
+        return x in self.items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return "OrderedSet({})".format(list(self.items))
+
+    def add(self,x):
+        self.items[x] = None
+
+    def discard(self,x):
+        self.items.pop(x,None)
+
+class Progress:
+    """
+        Prints percent checkpoints while reading @size bytes of input.
+    """
+    def __init__(self,size):
+        self.size = max(size,1)
+        self.checkpoint = 1
+
+    def report(self,position):
+        percent = int(position*100/self.size)
+        if percent >= self.checkpoint:
+            print("Checkpoint reached: {}%".format(percent))
+            self.checkpoint = percent + 1
+
+class Embeddings(Mapping):
+    """
+        Word vectors as a vocabulary (word -> row) and a float32 matrix
+        stored as .npy in @file. While parsing, rows are collected in
+        chunks that are spilled to disk, loading memory maps the matrix,
+        so looking up a word only reads its row.
+    """
+    ### rows kept in memory before they are written to disk
+    chunk = 2**16
+
+    def __init__(self,file,index=None):
+        self.file = file
+        self.index = {} if index is None else index
+        self.vectors = None
+        self.buffer = []
+        self.rows = 0
+        self.dimensions = None
+
+    def __getitem__(self,word):
+        return self.getVectors()[self.index[word]]
+
+    def __contains__(self,word):
+        return word in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def getVectors(self):
+        if self.vectors is None:
+            self.vectors = np.load(self.file,mmap_mode="r")
+        return self.vectors
+
+    """
+        Adds the vector given as list of strings or numbers. A word added
+        twice keeps its position but points to the later vector.
+    """
+    def add(self,word,vector):
+        if self.rows == 0 and len(self.buffer) == 0 and os.path.isfile(self.file + ".part"):
+            ### leftovers of an interrupted run
+            os.remove(self.file + ".part")
+        self.index[word] = self.rows + len(self.buffer)
+        self.buffer.append(np.array(vector,dtype=np.float32))
+        if len(self.buffer) >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        rows = np.stack(self.buffer)
+        self.dimensions = rows.shape[1]
+        with open(self.file + ".part","ab") as f:
+            f.write(rows.tobytes())
+        self.rows += len(self.buffer)
+        self.buffer = []
+
+    """
+        Writes the collected rows to @file as .npy.
+    """
+    def save(self):
+        self.flush()
+        with open(self.file,"wb") as f:
+            np.lib.format.write_array_header_1_0(f,{
+                    "descr":np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                    "fortran_order":False,
+                    "shape":(self.rows,self.dimensions if self.dimensions is not None else 0)
+            })
+            if self.rows > 0:
+                with open(self.file + ".part","rb") as part:
+                    shutil.copyfileobj(part,f)
+        if os.path.isfile(self.file + ".part"):
+            os.remove(self.file + ".part")
+        self.vectors = None
+
+class URITable:
+    """
+        Interns SciGraph URIs as int32 ids. Every entity type (the path
+        segment after /things/, e.g. "books") has its own id space, the ids
+        are positions in a list of URI suffixes persisted in @file.
+    """
+    prefix = "<http://scigraph.springernature.com/things/"
+
+    ### entity types that are interned
+    types = [
+            "books",
+            "book-chapters",
+            "book-editions",
+            "conferences",
+            "conference-series",
+            "contributions"
+    ]
+
+    def __init__(self,file):
+        self.file = file
+        self.tables = {t:[] for t in self.types}
+        if os.path.isfile(file):
+            with open(file,"rb") as f:
+                self.tables.update(pickle.load(f))
+        self.indexes = {t:pd.Index(self.tables[t]) for t in self.types}
+        # entity type of every interned column by column name
+        self.columns = {}
+        self.changed = False
+
+    def save(self):
+        if self.changed:
+            with open(self.file,"wb") as f:
+                pickle.dump(self.tables, f)
+            self.changed = False
+
+    """
+        Returns @column with URIs replaced by their int32 ids or the column
+        itself if it does not hold URIs of a single interned entity type.
+    """
+    def intern(self,name,column):
+        if len(column) == 0 or isinstance(column.iloc[0],(list,np.ndarray)):
+            return column
+        categorical = pd.Categorical(column)
+        if (categorical.codes == -1).any():
+            return column
+        categories = pd.Index(categorical.categories.astype(str))
+        if not categories[0].startswith(self.prefix):
+            return column
+        suffixes = categories.str[len(self.prefix):-1]
+        entity = suffixes[0].split("/")[0]
+        if entity not in self.indexes or not suffixes.str.startswith(entity + "/").all():
+            return column
+        keys = suffixes.str[len(entity)+1:]
+
+        ids = self.indexes[entity].get_indexer(keys)
+        new = ids == -1
+        if new.any():
+            ids[new] = np.arange(len(self.tables[entity]),len(self.tables[entity])+new.sum())
+            self.tables[entity].extend(keys[new])
+            self.indexes[entity] = pd.Index(self.tables[entity])
+            self.changed = True
+
+        self.columns[name] = entity
+        return pd.Series(ids.astype(np.int32)[categorical.codes],index=column.index,name=column.name)
+
+    """
+        Maps the ids in @column back to the URIs of entity type @entity.
+    """
+    def resolve(self,entity,column):
+        table = np.asarray(self.tables[entity],dtype=object)
+        mask = column.notna().to_numpy()
+        uris = np.full(len(column),np.nan,dtype=object)
+        uris[mask] = self.prefix + entity + "/" + table[column.to_numpy()[mask].astype(np.int64)] + ">"
+        return pd.Series(uris,index=column.index,name=column.name)
+
+    """
+        Resolves all interned columns of @df back to URIs.
+    """
+    def resolveFrame(self,df):
+        for name, entity in self.columns.items():
+            if name in df.columns and df[name].dtype.kind in "iuf":
+                df[name] = self.resolve(entity,df[name])
+        return df
+
 class FileParser:
     regex = '([<"].*?[>"])+?'
-    
+
+    ### version of the pickled format written by savePersistent
+    persistentVersion = 4
+
+    ### predicate each line processor reacts to (None = every line)
+    predicates = {
+            "processLineBooks":nt_has_conference,
+            "processLineBooksConferences":nt_has_conference,
+            "processLineConferences":None,
+            "processLineConferencesAttributeName":nt_name,
+            "processLineConferencesAttributeAcronym":nt_acronym,
+            "processLineConferencesAttributeCity":nt_city,
+            "processLineConferencesAttributeCountry":nt_country,
+            "processLineConferencesAttributeDateEnd":nt_dateend,
+            "processLineConferencesAttributeDateStart":nt_datestart,
+            "processLineConferencesAttributeYear":nt_year,
+            "processLineConferenceseries":None,
+            "processLineConferencesConferenceseries":nt_has_conference_series,
+            "processLineConferenceseriesAttributeName":nt_name,
+            "processLineChapters":nt_has_book,
+            "processLineChaptersAttributeTitle":nt_title,
+            "processLineChaptersAttributeLanguage":nt_language,
+            "processLineChaptersBooks":nt_has_book,
+            "processLineChaptersBookEditions":nt_has_book_edition,
+            "processLineBookEditions":nt_has_book_edition,
+            "processLineBookEditionsAttributeMarketCodes":nt_has_productmarketcode,
+            "processLineMarketCodesAttributeName":nt_marketcode_name,
+            "processLineContributions":nt_has_contribution,
+            "processLineContributionsChapters":nt_has_contribution,
+            "processLineContributionsAttributePublishedName":nt_publishedname,
+            "processLineContributionsAttributeIsCorresponding":nt_iscorresponding,
+            "processLineContributionsAttributeOrder":nt_order,
+            "processLineChaptersAttributeAbstract":nt_abstract,
+            "processLineGlove":None,
+            "processLineCSO":None
+    }
+
     path_raw = os.path.join(
             os.path.dirname(os.path.realpath(__file__)),
             "..","..","data","raw"
@@ -86,9 +335,96 @@ class FileParser:
                 "1801-1900"
             ]
     
-    def __init__(self):
+    ### magic numbers of the supported compressed raw files
+    magic = {
+            "gzip":b"\x1f\x8b",
+            "bz2":b"BZh",
+            "zstd":b"\x28\xb5\x2f\xfd"
+    }
+
+    ### line processors whose values are quoted literals, the quotes are
+    ### stripped when building data frames
+    literals = [
+            "processLineConferencesAttributeName",
+            "processLineConferencesAttributeAcronym",
+            "processLineConferencesAttributeCity",
+            "processLineConferencesAttributeCountry",
+            "processLineConferencesAttributeDateEnd",
+            "processLineConferencesAttributeDateStart",
+            "processLineConferencesAttributeYear",
+            "processLineConferenceseriesAttributeName",
+            "processLineChaptersAttributeTitle",
+            "processLineChaptersAttributeLanguage",
+            "processLineMarketCodesAttributeName",
+            "processLineContributionsAttributePublishedName",
+            "processLineContributionsAttributeIsCorresponding",
+            "processLineContributionsAttributeOrder"
+    ]
+
+    ### line processors storing literals with their escape sequences
+    ### decoded (since persistent version 4)
+    unescaped = [
+            "processLineChaptersAttributeAbstract",
+            "processLineConferencesAttributeName",
+            "processLineConferenceseriesAttributeName",
+            "processLineContributionsAttributePublishedName"
+    ]
+
+    ### escape sequences of N-Triples literals
+    escapes = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+    escapedCharacters = {
+            "t":"\t",
+            "b":"\b",
+            "n":"\n",
+            "r":"\r",
+            "f":"\f",
+            '"':'"',
+            "'":"'",
+            "\\":"\\"
+    }
+
+    ### version of the columnar files written by getDataFrame
+    columnarVersion = 3
+
+    ### line processors that can not be run on parts of a file
+    unshardable = [
+            "processLineGlove"
+    ]
+
+    ### line processors keeping the first value of a key, later values of
+    ### the key are ignored
+    firstValue = [
+            "processLineMarketCodesAttributeName"
+    ]
+
+    ### line processors appending to attribute lists without skipping
+    ### values already in the list
+    repeatedValues = [
+            "processLineCSO"
+    ]
+
+    ### line processors whose results can not be updated triple by triple
+    ### (entities collected from any triple, nested variables)
+    undeltable = [
+            "processLineConferences",
+            "processLineConferenceseries",
+            "processLineGlove",
+            "processLineCSO"
+    ]
+
+    def __init__(self,workers=1,interned=False,release="2017-11-07"):
         self.start_time = []
         self.persistent = {}
+        # date of the SciGraph dump the raw files belong to
+        self.release = release
+        self.diffs = {}
+        # number of processes used to parse a file
+        self.workers = workers
+        # whether getDataFrame returns int32 ids instead of URIs
+        self.interned = interned
+        self.uris = None
+        # processes read through getTable or getValues
+        self.read = set()
         
         self.processes = {
             # computer science ontology
@@ -105,137 +441,139 @@ class FileParser:
                     "processLine":"processLineGlove",
                     "persistentFile":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6d50.pkl"),
                     "encoding":"utf8",
-                    "persistentVariable":{}
+                    "persistentVariable":Embeddings(os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6d50.npy"))
             },
             "glove.6d100":{
                     "filename":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6B.100d.txt"),
                     "processLine":"processLineGlove",
                     "persistentFile":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6d100.pkl"),
                     "encoding":"utf8",
-                    "persistentVariable":{}
+                    "persistentVariable":Embeddings(os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6d100.npy"))
             },
             "glove.6d200":{
                     "filename":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6B.200d.txt"),
                     "processLine":"processLineGlove",
                     "persistentFile":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6d200.pkl"),
                     "encoding":"utf8",
-                    "persistentVariable":{}
+                    "persistentVariable":Embeddings(os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6d200.npy"))
             },
             "glove.6d300":{
                     "filename":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6B.300d.txt"),
                     "processLine":"processLineGlove",
                     "persistentFile":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6d300.pkl"),
                     "encoding":"utf8",
-                    "persistentVariable":{}
+                    "persistentVariable":Embeddings(os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.6d300.npy"))
             },
             "glove.42d300":{
                     "filename":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.42B.300d.txt"),
                     "processLine":"processLineGlove",
                     "persistentFile":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.42d300.pkl"),
                     "encoding":"utf8",
-                    "persistentVariable":{}
+                    "persistentVariable":Embeddings(os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.42d300.npy"))
             },
             "glove.840d300":{
                     "filename":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.840B.300d.txt"),
                     "processLine":"processLineGlove",
                     "persistentFile":os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.840d300.pkl"),
                     "encoding":"utf8",
-                    "persistentVariable":{}
+                    "persistentVariable":Embeddings(os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","data","external","glove.840d300.npy"))
             },
             "books":{
-                    "filename":self.path_raw + "springernature-scigraph-books.cc-by.2017-11-07.nt",
+                    "filename":self.getRawFile("books","cc-by"),
                     "processLine":"processLineBooks",
                     "persistentFile":os.path.join(self.path_persistent,"books.pkl"),
-                    "persistentVariable":[]
+                    "persistentVariable":OrderedSet()
             },
             "books_conferences":{
-                    "filename":self.path_raw + "springernature-scigraph-books.cc-by.2017-11-07.nt",
+                    "filename":self.getRawFile("books","cc-by"),
                     "processLine":"processLineBooksConferences",
                     "persistentFile":os.path.join(self.path_persistent,"books_conferences.pkl"),
                     "persistentVariable":{}
             },
             ### bookeditions
             "bookeditions":{
-                    "filename":self.path_raw + "springernature-scigraph-books.cc-by.2017-11-07.nt",
+                    "filename":self.getRawFile("books","cc-by"),
                     "processLine":"processLineBookEditions",
                     "persistentFile":os.path.join(self.path_persistent,"bookeditions.pkl"),
-                    "persistentVariable":[]
+                    "persistentVariable":OrderedSet(),
+                    "dependencies":["books"]
             },
             ### bookeditions#marketcodes
             "bookeditions#marketcodes":{
-                    "filename":self.path_raw + "springernature-scigraph-books.cc-by.2017-11-07.nt",
+                    "filename":self.getRawFile("books","cc-by"),
                     "processLine":"processLineBookEditionsAttributeMarketCodes",
                     "persistentFile":os.path.join(self.path_persistent,"bookeditions#marketcodes.pkl"),
-                    "persistentVariable":{}
+                    "persistentVariable":{},
+                    "dependencies":["bookeditions"]
             },
             "marketcodes#name":{
-                    "filename":self.path_raw + "springernature-scigraph-product-market-codes.cc-by.2017-11-07.nt",
+                    "filename":self.getRawFile("product-market-codes","cc-by"),
                     "processLine":"processLineMarketCodesAttributeName",
                     "persistentFile":os.path.join(self.path_persistent,"marketcodes#name.pkl"),
                     "persistentVariable":{}
             },
             "conferences":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferences",
                     "persistentFile":os.path.join(self.path_persistent,"conferences.pkl"),
-                    "persistentVariable":[]
+                    "persistentVariable":OrderedSet()
             },
             "conferences#name":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferencesAttributeName",
                     "persistentFile":os.path.join(self.path_persistent,"conferences#name.pkl"),
                     "persistentVariable":{}
             },
             "conferences#acronym":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferencesAttributeAcronym",
                     "persistentFile":os.path.join(self.path_persistent,"conferences#acronym.pkl"),
                     "persistentVariable":{}
             },
             "conferences#city":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferencesAttributeCity",
                     "persistentFile":os.path.join(self.path_persistent,"conferences#city.pkl"),
                     "persistentVariable":{}
             },
             "conferences#country":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferencesAttributeCountry",
                     "persistentFile":os.path.join(self.path_persistent,"conferences#country.pkl"),
                     "persistentVariable":{}
             },
             "conferences#dateend":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferencesAttributeDateEnd",
                     "persistentFile":os.path.join(self.path_persistent,"conferences#dateend.pkl"),
                     "persistentVariable":{}
             },
             "conferences#datestart":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferencesAttributeDateStart",
                     "persistentFile":os.path.join(self.path_persistent,"conferences#datestart.pkl"),
                     "persistentVariable":{}
             },
             "conferences#year":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferencesAttributeYear",
                     "persistentFile":os.path.join(self.path_persistent,"conferences#year.pkl"),
                     "persistentVariable":{}
             },
             "conferenceseries":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferenceseries",
                     "persistentFile":os.path.join(self.path_persistent,"conferenceseries.pkl"),
-                    "persistentVariable":[]
+                    "persistentVariable":OrderedSet()
             },
             "conferenceseries#name":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferenceseriesAttributeName",
                     "persistentFile":os.path.join(self.path_persistent,"conferenceseries#name.pkl"),
                     "persistentVariable":{}
             },
             "conferences_conferenceseries":{
-                    "filename":self.path_raw + "springernature-scigraph-conferences.cc-zero.2017-11-07-UPDATED.nt",
+                    "filename":self.getRawFile("conferences","cc-zero"),
                     "processLine":"processLineConferencesConferenceseries",
                     "persistentFile":os.path.join(self.path_persistent,"conferences_conferenceseries.pkl"),
                     "persistentVariable":{}
@@ -247,89 +585,91 @@ class FileParser:
             year = str(year)
             ### chapters
             self.processes["chapters_" + year] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineChapters",
                 "persistentFile":os.path.join(self.path_persistent,"chapters_" + year + ".pkl"),
-                "persistentVariable":[]
+                "persistentVariable":OrderedSet(),
+                "dependencies":["books"]
             }
             ### chapters#abstract
             self.processes["chapters_" + year + "#abstract"] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by-nc.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by-nc"),
                 "processLine":"processLineChaptersAttributeAbstract",
                 "persistentFile":os.path.join(self.path_persistent,"chapters_" + year + "#abstract.pkl"),
                 "persistentVariable":{},
-                "parameters":"chapters_" + year
+                "dependencies":["chapters_" + year]
             }
             ### chapters#title
             self.processes["chapters_" + year + "#title"] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineChaptersAttributeTitle",
                 "persistentFile":os.path.join(self.path_persistent,"chapters_" + year + "#title.pkl"),
                 "persistentVariable":{},
-                "parameters":"chapters_" + year
+                "dependencies":["chapters_" + year]
             }
             ### chapters#language
             self.processes["chapters_" + year + "#language"] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineChaptersAttributeLanguage",
                 "persistentFile":os.path.join(self.path_persistent,"chapters_" + year + "#language.pkl"),
                 "persistentVariable":{},
-                "parameters":"chapters_" + year
+                "dependencies":["chapters_" + year]
             }
             ### chapters_books
             self.processes["chapters_books_" + year] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineChaptersBooks",
                 "persistentFile":os.path.join(self.path_persistent,"chapters_books_" + year + ".pkl"),
-                "persistentVariable":{}
+                "persistentVariable":{},
+                "dependencies":["books"]
             }
             ### chapters_bookeditions
             self.processes["chapters_bookeditions_" + year] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineChaptersBookEditions",
                 "persistentFile":os.path.join(self.path_persistent,"chapters_bookeditions_" + year + ".pkl"),
                 "persistentVariable":{},
-                "parameters":"chapters_" + year
+                "dependencies":["chapters_" + year]
             }
             ### contributions
             self.processes["contributions_" + year] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineContributions",
                 "persistentFile":os.path.join(self.path_persistent,"contributions_" + year + ".pkl"),
-                "persistentVariable":[],
-                "parameters":"chapters_" + year
+                "persistentVariable":OrderedSet(),
+                "dependencies":["chapters_" + year]
             }
             ### contributions#publishedName
             self.processes["contributions_" + year + "#publishedName"] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineContributionsAttributePublishedName",
                 "persistentFile":os.path.join(self.path_persistent,"contributions_" + year + "#publishedName.pkl"),
                 "persistentVariable":{},
-                "parameters":"contributions_" + year
+                "dependencies":["contributions_" + year]
             }
             ### contributions#isCorresponding
             self.processes["contributions_" + year + "#isCorresponding"] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineContributionsAttributeIsCorresponding",
                 "persistentFile":os.path.join(self.path_persistent,"contributions_" + year + "#isCorresponding.pkl"),
                 "persistentVariable":{},
-                "parameters":"contributions_" + year
+                "dependencies":["contributions_" + year]
             }
             ### contributions#order
             self.processes["contributions_" + year + "#order"] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineContributionsAttributeOrder",
                 "persistentFile":os.path.join(self.path_persistent,"contributions_" + year + "#order.pkl"),
                 "persistentVariable":{},
-                "parameters":"contributions_" + year
+                "dependencies":["contributions_" + year]
             }
             ### contributions_chapters
             self.processes["contributions_chapters_" + year] = {
-                "filename":self.path_raw + "springernature-scigraph-book-chapters-" + year + ".cc-by.2017-11-07.nt",
+                "filename":self.getRawFile("book-chapters-" + year,"cc-by"),
                 "processLine":"processLineContributionsChapters",
                 "persistentFile":os.path.join(self.path_persistent,"contributions_chapters_" + year + ".pkl"),
                 "persistentVariable":{},
-                "parameters":"chapters_" + year
+                "dependencies":["chapters_" + year]
         }
         
     ### start runtime check
@@ -339,6 +679,25 @@ class FileParser:
     ### print runtime information
     def toc(self):
         print("--- %s seconds ---" % (time.time() - self.start_time.pop()))
+
+    """
+        Path of a raw SciGraph dump file, e.g. ("books","cc-by"). If only a
+        compressed copy of the dump exists, its path is returned.
+    """
+    def getRawFile(self,dataset,license,release=None):
+        release = self.release if release is None else release
+        if dataset == "conferences" and release == "2017-11-07":
+            ### the conferences of this dump were republished
+            release = "2017-11-07-UPDATED"
+        filename = os.path.join(
+                self.path_raw,
+                "springernature-scigraph-" + dataset + "." + license + "." + release + ".nt"
+        )
+        if not os.path.isfile(filename):
+            for extension in [".gz",".bz2",".zst"]:
+                if os.path.isfile(filename + extension):
+                    return filename + extension
+        return filename
     
     def getData(self,process):
         ### is the data already present?
@@ -346,93 +705,880 @@ class FileParser:
             return self.persistent[process]
         
         print("Process '{}' not in memory yet.".format(process))
-        
+
         ### load from persistence if already processed
-        if os.path.isfile(self.processes[process]["persistentFile"]):
-            with open(self.processes[process]["persistentFile"],"rb") as f:
-                self.persistent[process] = pickle.load(f)
-                return self.persistent[process]
-            
+        if self.loadPersistent(process):
+            return self.persistent[process]
+
         print("Process '{}' not persistent yet. Processing.".format(process))
-        
-        ### get the data from scratch
-        self.persistent[process] = self.processes[process]["persistentVariable"]
-        self.parseFile(
-                self.processes[process]["filename"],
-                self.processes[process]["processLine"],
-                self.persistent[process],
-                self.processes[process]["parameters"] if "parameters" in self.processes[process] else None,
-                self.processes[process]["encoding"] if "encoding" in self.processes[process] else None
-        )
+
+        ### get the data from scratch, dependencies first
+        return self.getDataFused([process])[0]
+
+    """
+        Loads the pickle of @process into memory. Returns False if there is none.
+    """
+    def loadPersistent(self,process):
+        if process in self.persistent:
+            return True
+        if not os.path.isfile(self.processes[process]["persistentFile"]):
+            return False
+        with open(self.processes[process]["persistentFile"],"rb") as f:
+            data = pickle.load(f)
+
+        ### pickles without version are the plain variables (version 1)
+        if isinstance(data,dict) and "__version__" in data:
+            version = data["__version__"]
+            data = data["data"]
+        else:
+            version = 1
+
+        self.persistent[process] = self.upgradePersistent(process,data,version)
+        return True
+
+    """
+        Converts data of @process read from a pickle of format @version to
+        the in-memory representation.
+    """
+    def upgradePersistent(self,process,data,version):
+        template = self.processes[process]["persistentVariable"]
+        if version < 4 and self.processes[process]["processLine"] in self.unescaped:
+            data = {key:self.unescape(value) for key, value in data.items()}
+        if isinstance(template,OrderedSet):
+            data = OrderedSet(data)
+        elif isinstance(template,Embeddings):
+            if version < 3:
+                ### dict of float lists, converted to the matrix file
+                embeddings = Embeddings(template.file)
+                for word, vector in data.items():
+                    embeddings.add(word,vector)
+                embeddings.save()
+                data = embeddings.index
+            data = Embeddings(template.file,data)
+        return data
+
+    """
+        Writes the in-memory data of @process to its pickle. Entity sets are
+        stored as plain lists.
+    """
+    def savePersistent(self,process):
+        data = self.persistent[process]
+        if isinstance(data,OrderedSet):
+            data = list(data)
+        elif isinstance(data,Embeddings):
+            data.save()
+            data = data.index
         with open(self.processes[process]["persistentFile"],"wb") as f:
-            pickle.dump(self.persistent[process], f)
-        
-        return self.persistent[process]
-    
-    def parseFile(self,filename,processLine,variable,parameters,encoding):
-        self.countLines(filename)
-        self.processFile(filename,processLine,variable,parameters,encoding)
-        
+            pickle.dump({"__version__":self.persistentVersion,"data":data}, f)
+        self.recordFingerprint(process)
+
+    """
+        Processes that have to be in memory before @process can be parsed.
+    """
+    def getDependencies(self,process):
+        return self.processes[process]["dependencies"] if "dependencies" in self.processes[process] else []
+
+    """
+        The data of the dependency of @process as handed to its line
+        processor (None for processes without dependency). Processes
+        declare at most one dependency.
+    """
+    def getDependencyData(self,process):
+        dependencies = self.getDependencies(process)
+        return self.persistent[dependencies[0]] if len(dependencies) > 0 else None
+
+    """
+        Makes all given processes available like getData, but parses every
+        file only once: all missing processes reading the same file whose
+        dependencies are ready are fused into one pass over that file.
+        Processes depending on other processes of the same file are run in
+        a following pass. The declared dependencies are resolved up front
+        in topological order; with @self.workers > 1 the files of one pass
+        are parsed in parallel.
+    """
+    def getDataFused(self,processes,refresh=()):
+        ### collect missing processes including their missing dependencies
+        ### (processes in @refresh are parsed again even if persistent)
+        pending = []
+        stack = list(processes)
+        while len(stack) > 0:
+            process = stack.pop()
+            if process in pending:
+                continue
+            if process in refresh:
+                self.persistent.pop(process,None)
+            elif self.loadPersistent(process):
+                continue
+            pending.append(process)
+            stack.extend(self.getDependencies(process))
+
+        while len(pending) > 0:
+            ready = [
+                    p for p in pending
+                    if all(d in self.persistent for d in self.getDependencies(p))
+            ]
+
+            ### group the ready processes by their file
+            files = {}
+            for process in ready:
+                key = (
+                        self.processes[process]["filename"],
+                        self.processes[process]["encoding"] if "encoding" in self.processes[process] else None
+                )
+                if key not in files:
+                    files[key] = []
+                files[key].append(process)
+
+            if self.workers > 1 and len(files) > 1:
+                self.processFilesParallel(files)
+            else:
+                for (filename, encoding), group in files.items():
+                    print("Processing {} in a single pass.".format(group))
+                    for process in group:
+                        self.persistent[process] = self.newVariable(process)
+                    self.processFileFused(filename,group,encoding)
+
+            for group in files.values():
+                for process in group:
+                    self.savePersistent(process)
+                    pending.remove(process)
+
+        return [self.persistent[p] for p in processes]
+
+    """
+        An empty variable of @process to parse into, a copy of its
+        "persistentVariable" so the template itself is never filled.
+    """
+    def newVariable(self,process):
+        return copy.deepcopy(self.processes[process]["persistentVariable"])
+
+    """
+        Returns the data of @process as a DataFrame with the given @columns
+        (key and value for dicts, one column for entity sets). Literal
+        values are returned without their quotes.
+        If pyarrow is installed, the frame is cached next to the pickle as a
+        parquet file with dictionary encoded URI columns. Later calls memory
+        map that file instead of building the frame from the pickled data.
+        @filters maps columns to the values to keep, see getTable.
+    """
+    def getDataFrame(self,process,columns,filters=None):
+        try:
+            import pyarrow
+        except ImportError:
+            df = pd.DataFrame(dict(zip(columns,self.getValues(process))),columns=columns)
+            for column, values in (filters or {}).items():
+                df = df[df[column].isin(values)].reset_index(drop=True)
+            return self.internFrame(df)
+
+        return self.toFrame(self.getTable(process,columns,filters))
+
+    """
+        Returns the data of @process as a pyarrow table with the given
+        @columns, read from the memory mapped parquet file (written first if
+        missing or outdated).
+        @filters maps columns to the values to keep (a list or a pyarrow
+        array). The rows are selected on the mapped table, so values of
+        rows filtered out are never converted to Python objects.
+    """
+    def getTable(self,process,columns,filters=None):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        self.read.add(process)
+        file = self.getColumnarFile(process)
+        if self.hasColumnar(process):
+            table = pq.read_table(file,memory_map=True).rename_columns(columns)
+        else:
+            arrays = []
+            for value in self.getValues(process):
+                array = pa.array(value)
+                if pa.types.is_string(array.type) and len(value) > 0 and value[0].startswith("<"):
+                    array = array.dictionary_encode()
+                arrays.append(array)
+            table = pa.Table.from_arrays(arrays,names=columns)
+            table = table.replace_schema_metadata({"version":str(self.columnarVersion)})
+            pq.write_table(table,file)
+
+        for column, values in (filters or {}).items():
+            if not isinstance(values,(pa.Array,pa.ChunkedArray)):
+                values = pa.array(list(values))
+            if isinstance(values,pa.ChunkedArray):
+                values = values.combine_chunks()
+            if pa.types.is_dictionary(values.type):
+                values = values.cast(values.type.value_type)
+            table = table.filter(pc.is_in(table.column(column),value_set=values))
+        return table
+
+    """
+        The columns of @process as lists (keys and values for dicts), with
+        the quotes of literal values stripped.
+    """
+    def getValues(self,process):
+        self.read.add(process)
+        data = self.getData(process)
+        if isinstance(data,dict):
+            values = [list(data.keys()), list(data.values())]
+        else:
+            values = [list(data)]
+
+        if self.processes[process]["processLine"] in self.literals:
+            values[1] = [value[1:-1] for value in values[1]]
+
+        return values
+
+    """
+        Converts a pyarrow @table to a DataFrame. Dictionary encoded columns
+        become int32 ids if @self.interned and plain strings otherwise, so
+        merges and groupbys downstream do not run on categoricals.
+    """
+    def toFrame(self,table):
+        if not self.interned:
+            import pyarrow as pa
+            for i, field in enumerate(table.schema):
+                if pa.types.is_dictionary(field.type):
+                    table = table.set_column(i,field.name,table.column(i).cast(pa.string()))
+        return self.internFrame(table.to_pandas())
+
+    """
+        The URI table used for interning, loaded on first use.
+    """
+    def getURIs(self):
+        if self.uris is None:
+            self.uris = URITable(os.path.join(self.path_persistent,"uris.pkl"))
+        return self.uris
+
+    """
+        Replaces the URI columns of @df by int32 ids if @self.interned.
+    """
+    def internFrame(self,df):
+        if not self.interned:
+            return df
+        uris = self.getURIs()
+        for column in df.columns:
+            df[column] = uris.intern(column,df[column])
+        uris.save()
+        return df
+
+    def getColumnarFile(self,process):
+        return os.path.splitext(self.processes[process]["persistentFile"])[0] + ".parquet"
+
+    """
+        Whether the columnar file of @process exists in the current format
+        and is not older than
+        its pickle.
+    """
+    def hasColumnar(self,process):
+        file = self.getColumnarFile(process)
+        if not os.path.isfile(file):
+            return False
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(file).metadata
+        if metadata is None or metadata.get(b"version") != str(self.columnarVersion).encode():
+            return False
+        pickled = self.processes[process]["persistentFile"]
+        return not os.path.isfile(pickled) or os.path.getmtime(file) >= os.path.getmtime(pickled)
+
+    ################## Incremental updates ##################
+
+    """
+        Brings the given processes up to date with the raw files of
+        @self.release without parsing everything again.
+        The input file of every process is compared with the fingerprint
+        recorded when the process was built. For changed files, the lines
+        removed from and added to the file the process was built from are
+        applied to the persisted data. Processes whose previous file is
+        gone, whose line processor can not be updated triple by triple, or
+        whose dependencies changed are parsed again (fused per file).
+        @previous is the release processes without fingerprint were built
+        from.
+    """
+    def updateData(self,processes,previous=None):
+        changed = []
+        rebuild = []
+
+        for process in self.orderProcesses(processes):
+            filename = self.processes[process]["filename"]
+            processLine = self.processes[process]["processLine"]
+            fingerprint = self.loadFingerprint(process)
+            dependenciesChanged = any(d in changed for d in self.getDependencies(process))
+
+            if fingerprint is not None:
+                old = fingerprint["filename"]
+            elif previous is not None:
+                old = self.getPreviousFile(filename,previous)
+            else:
+                old = None
+
+            if not os.path.isfile(self.processes[process]["persistentFile"]):
+                print("Process '{}' not persistent yet.".format(process))
+            elif not dependenciesChanged and self.isUnchanged(fingerprint,filename):
+                continue
+            elif not dependenciesChanged and old is not None and os.path.isfile(old) \
+                    and processLine not in self.undeltable:
+                print("Updating process '{}' from {}.".format(process,old))
+                for dependency in self.getDependencies(process) + [process]:
+                    self.loadPersistent(dependency)
+                removed, added = self.diffFile(
+                        old,
+                        filename,
+                        self.processes[process]["encoding"] if "encoding" in self.processes[process] else None
+                )
+                if self.applyDelta(process,removed,added):
+                    changed.append(process)
+                self.savePersistent(process)
+                continue
+
+            print("Process '{}' is parsed again.".format(process))
+            rebuild.append(process)
+            changed.append(process)
+
+        if len(rebuild) > 0:
+            self.getDataFused(rebuild,refresh=rebuild)
+
+        return changed
+
+    """
+        @processes and all their dependencies, dependencies first.
+    """
+    def orderProcesses(self,processes):
+        ordered = []
+        def visit(process):
+            if process in ordered:
+                return
+            for dependency in self.getDependencies(process):
+                visit(dependency)
+            ordered.append(process)
+        for process in processes:
+            visit(process)
+        return ordered
+
     """
-        Count the lines upfront to provide progress.
+        The raw file of release @previous corresponding to @filename.
     """
-    def countLines(self,filename):
-        print("Start counting lines.")
+    def getPreviousFile(self,filename,previous):
+        match = re.match(r"springernature-scigraph-(.+)\.(cc-[a-z-]+)\.\d{4}-\d{2}-\d{2}",os.path.basename(filename))
+        if match is None:
+            return None
+        return self.getRawFile(match.group(1),match.group(2),previous)
+
+    """
+        Cheap fingerprint of a file: size, modification time and a hash of
+        its first and last megabyte.
+    """
+    def fingerprint(self,filename):
+        size = os.path.getsize(filename)
+        sample = hashlib.sha1()
+        with open(filename,"rb") as f:
+            sample.update(f.read(2**20))
+            if size > 2**21:
+                f.seek(size-2**20)
+            sample.update(f.read(2**20))
+        return {
+                "filename":filename,
+                "size":size,
+                "mtime":os.path.getmtime(filename),
+                "sample":sample.hexdigest()
+        }
+
+    def isUnchanged(self,fingerprint,filename):
+        if fingerprint is None or not os.path.isfile(filename):
+            return False
+        if fingerprint["filename"] == filename \
+                and fingerprint["size"] == os.path.getsize(filename) \
+                and fingerprint["mtime"] == os.path.getmtime(filename):
+            return True
+        current = self.fingerprint(filename)
+        return fingerprint["size"] == current["size"] and fingerprint["sample"] == current["sample"]
+
+    """
+        The fingerprint of a process is stored next to its pickle.
+    """
+    def getFingerprintFile(self,process):
+        return os.path.splitext(self.processes[process]["persistentFile"])[0] + ".fingerprint"
+
+    def loadFingerprint(self,process):
+        file = self.getFingerprintFile(process)
+        if not os.path.isfile(file):
+            return None
+        with open(file,"r",encoding="utf8") as f:
+            return json.load(f)
+
+    """
+        Remembers which version of its raw file @process was built from.
+    """
+    def recordFingerprint(self,process):
+        filename = self.processes[process]["filename"]
+        if not os.path.isfile(filename):
+            return
+        with open(self.getFingerprintFile(process),"w",encoding="utf8") as f:
+            json.dump(self.fingerprint(filename), f)
+
+    """
+        Lines removed from @old and added in @new (as sets of lines, the
+        order within the file is ignored). Computed once per pair of files.
+    """
+    def diffFile(self,old,new,encoding):
+        if (old,new) in self.diffs:
+            return self.diffs[(old,new)]
+
+        print("Comparing {} with {}.".format(old,new))
         self.tic()
-        
-        count = 0
-        with open(filename,encoding="utf8") as f:
-            for line in f:
-                count += 1
-        
-        self.filesize = count
-        self.count = 0
-        self.checkpoint = int(self.filesize/100)
-        
+
+        hashes = []
+        for filename in [old,new]:
+            with self.openRaw(filename,binary=True) as (f, raw):
+                hashes.append(np.fromiter((hash(line) for line in f),dtype=np.int64))
+        removed = set(np.setdiff1d(hashes[0],hashes[1]).tolist())
+        added = set(np.setdiff1d(hashes[1],hashes[0]).tolist())
+        del hashes
+
+        lines = []
+        for filename, selected in [(old,removed),(new,added)]:
+            with self.openRaw(filename,binary=True) as (f, raw):
+                lines.append([
+                        line.decode(encoding if encoding is not None else "utf8")
+                        for line in f if hash(line) in selected
+                ])
+
         self.toc()
-        print("Finished counting lines: {}".format(self.filesize))
-    
+        print("Removed lines: {}, added lines: {}".format(len(lines[0]),len(lines[1])))
+
+        self.diffs[(old,new)] = lines
+        return lines
+
+    """
+        Applies removed and added lines to the data of @process: the lines
+        are run through the line processor into empty variables which are
+        then subtracted from and merged into the persistent variable. The
+        entities and keys touched by the delta are then read again from the
+        current file, as other triples of them (e.g. a second title of a
+        chapter) are not part of the delta.
+        Returns whether the data changed.
+    """
+    def applyDelta(self,process,removed,added):
+        processLine = self.processes[process]["processLine"]
+        processLineFunction = self.__getattribute__(processLine)
+        dependency = self.getDependencyData(process)
+        predicate = self.predicates[processLine]
+        variable = self.persistent[process]
+
+        parts = []
+        for lines in [removed,added]:
+            part = self.newVariable(process)
+            for line in lines:
+                triple = line.split(" ",2)
+                if predicate is None or (len(triple) == 3 and triple[1] == predicate):
+                    processLineFunction(line,part,dependency)
+            parts.append(part)
+
+        self.subtractVariable(variable,parts[0])
+        self.mergeVariable(variable,parts[1],processLine)
+
+        keys = set(parts[0]) | set(parts[1])
+        if len(keys) > 0:
+            self.reprocessKeys(process,keys)
+
+        return len(parts[0]) > 0 or len(parts[1]) > 0
+
+    """
+        Parses the lines of the current file of @process whose subject or
+        object is one of @keys (entities or dict keys) and replaces the
+        data of these keys with the result, so they hold what a full parse
+        of the file would give them.
     """
-        Prints information about the progress.
+    def reprocessKeys(self,process,keys):
+        processLine = self.processes[process]["processLine"]
+        processLineFunction = self.__getattribute__(processLine)
+        dependency = self.getDependencyData(process)
+        predicate = self.predicates[processLine]
+        part = self.newVariable(process)
+
+        with self.openRaw(
+                self.processes[process]["filename"],
+                self.processes[process]["encoding"] if "encoding" in self.processes[process] else None
+        ) as (f, raw):
+            for line in f:
+                triple = line.split(" ",2)
+                if len(triple) < 3 or (predicate is not None and triple[1] != predicate):
+                    continue
+                if triple[0] in keys or triple[2].split(" ",1)[0] in keys:
+                    processLineFunction(line,part,dependency)
+
+        variable = self.persistent[process]
+        for key in keys:
+            if key not in part:
+                if isinstance(variable,dict):
+                    variable.pop(key,None)
+                else:
+                    variable.discard(key)
+            elif isinstance(variable,dict):
+                variable[key] = part[key]
+            else:
+                variable.add(key)
+
+    """
+        Removes the entities, attributes and attribute list entries in
+        @part from @target.
+    """
+    def subtractVariable(self,target,part):
+        if isinstance(target,dict):
+            for key, value in part.items():
+                if key not in target:
+                    continue
+                if isinstance(value,list):
+                    target[key] = [x for x in target[key] if x not in value]
+                    if len(target[key]) == 0:
+                        del target[key]
+                elif target[key] == value:
+                    del target[key]
+        else:
+            for value in part:
+                target.discard(value)
+
+    def parseFile(self,filename,processLine,variable,dependency,encoding):
+        self.processFile(filename,processLine,variable,dependency,encoding)
+
+    """
+        Compression of a raw file by its magic number: "gzip", "bz2",
+        "zstd" or None for plain text.
+    """
+    @staticmethod
+    def getCompression(filename):
+        with open(filename,"rb") as f:
+            magic = f.read(4)
+        for compression, prefix in FileParser.magic.items():
+            if magic.startswith(prefix):
+                return compression
+        return None
+
+    """
+        Opens a raw file for reading, decompressing it on the fly.
+        Yields the text (or with @binary the byte) stream and the
+        underlying compressed file for progress information. gzip is
+        decoded in background threads if python-isal is installed, zstd
+        with zstandard or the zstd command line tool.
+    """
+    @contextlib.contextmanager
+    def openRaw(self,filename,encoding=None,binary=False):
+        compression = self.getCompression(filename)
+        process = None
+        with open(filename,"rb") as raw:
+            if compression is None:
+                stream = raw
+            elif compression == "gzip":
+                try:
+                    from isal import igzip_threaded
+                    stream = igzip_threaded.open(raw,"rb",threads=max(self.workers,1))
+                except ImportError:
+                    stream = gzip.GzipFile(fileobj=raw)
+            elif compression == "bz2":
+                stream = bz2.BZ2File(raw)
+            else:
+                try:
+                    import zstandard
+                    stream = io.BufferedReader(
+                            zstandard.ZstdDecompressor().stream_reader(raw,read_across_frames=True)
+                    )
+                except ImportError:
+                    ### the child reads from our file descriptor, so
+                    ### raw.tell() still follows its progress
+                    process = subprocess.Popen(
+                            ["zstd","-d","-c","-q"],
+                            stdin=raw,
+                            stdout=subprocess.PIPE
+                    )
+                    stream = process.stdout
+            try:
+                if binary:
+                    yield stream, raw
+                else:
+                    yield io.TextIOWrapper(stream,encoding=encoding), raw
+            finally:
+                stream.close()
+                if process is not None:
+                    process.wait()
+
     """
-    def increaseCount(self):
-        self.count += 1
-        if (self.count % self.checkpoint == 0):
-            print("Checkpoint reached: {}%".format(int(self.count*100/self.filesize)))
+        Yields the lines of the opened file @f and reports the progress
+        based on the byte offset in the (possibly compressed) file @raw.
+    """
+    def trackProgress(self,f,raw):
+        progress = Progress(os.fstat(raw.fileno()).st_size)
+        count = 0
+        for line in f:
+            count += 1
+            if count & 4095 == 0:
+                progress.report(raw.tell())
+            yield line
+        progress.report(progress.size)
     
     """
         Process a given file calling function @process for each line.
-        @process is given @variable to store results.
+        @process is given @variable to store results and the data of its
+        @dependency.
     """
-    def processFile(self,filename,processLine,variable,parameters,encoding):
+    def processFile(self,filename,processLine,variable,dependency,encoding):
         print("Start processing file.")
         self.tic()
         
         processLineFunction = self.__getattribute__(processLine)
         
         ### 14sec / 23sec split / 77sec regex
-        with open(filename,encoding=encoding) as f:
-            for line in f:
-                self.increaseCount()
-                processLineFunction(line,variable,parameters)
+        with self.openRaw(filename,encoding) as (f, raw):
+            for line in self.trackProgress(f,raw):
+                processLineFunction(line,variable,dependency)
         
         self.toc()
         print("Finished processing file.")
-    
+
+    """
+        Process a given file once for all @processes. Each line is only
+        handed to the line processors interested in its predicate.
+    """
+    def processFileFused(self,filename,processes,encoding):
+        if self.workers > 1 and self.getCompression(filename) is None and all(
+                self.processes[p]["processLine"] not in self.unshardable for p in processes):
+            self.processFileSharded(filename,processes,encoding)
+            return
+
+        print("Start processing file.")
+        self.tic()
+
+        handlers, wildcards = self.getHandlers(processes)
+        with self.openRaw(filename,encoding) as (f, raw):
+            self.processLines(self.trackProgress(f,raw),handlers,wildcards)
+
+        self.toc()
+        print("Finished processing file.")
+
+    """
+        Process a given file for all @processes in a pool of @self.workers
+        processes. The file is split into newline aligned byte ranges, each
+        range is parsed into fresh variables and the results are merged in
+        file order into the persistent variables.
+    """
+    def processFileSharded(self,filename,processes,encoding):
+        print("Start processing file with {} workers.".format(self.workers))
+        self.tic()
+
+        dependencies = {}
+        for process in processes:
+            for dependency in self.getDependencies(process):
+                dependencies[dependency] = self.persistent[dependency]
+
+        shards = self.splitFile(filename,self.workers*4)
+        tasks = [
+                (filename,encoding,start,end,processes)
+                for start, end in shards
+        ]
+
+        pool = mp.Pool(
+                processes=self.workers,
+                initializer=_initShardWorker,
+                initargs=(dependencies,)
+        )
+        progress = Progress(shards[-1][1])
+        for (start, end), results in zip(shards,pool.imap(_processShard,tasks)):
+            for process, result in zip(processes,results):
+                self.mergeVariable(
+                        self.persistent[process],
+                        result,
+                        self.processes[process]["processLine"]
+                )
+            progress.report(end)
+        pool.close()
+        pool.join()
+
+        self.toc()
+        print("Finished processing file.")
+
+    """
+        Process independent files in a pool of @self.workers processes,
+        each file as a whole in a fused pass. @files maps (filename,
+        encoding) to the processes reading that file.
+    """
+    def processFilesParallel(self,files):
+        print("Start processing {} files with {} workers.".format(len(files),self.workers))
+        self.tic()
+
+        dependencies = {}
+        for group in files.values():
+            for process in group:
+                for dependency in self.getDependencies(process):
+                    dependencies[dependency] = self.persistent[dependency]
+
+        tasks = [
+                (filename,encoding,None,None,group)
+                for (filename, encoding), group in files.items()
+        ]
+
+        pool = mp.Pool(
+                processes=self.workers,
+                initializer=_initShardWorker,
+                initargs=(dependencies,)
+        )
+        for (filename, encoding, start, end, group), results in zip(tasks,pool.imap(_processShard,tasks)):
+            for process, result in zip(group,results):
+                self.persistent[process] = result
+            print("Processed {}.".format(group))
+        pool.close()
+        pool.join()
+
+        self.toc()
+        print("Finished processing files.")
+
+    """
+        Splits a file into at most @shards byte ranges (start, end), each
+        starting at the beginning of a line.
+    """
+    @staticmethod
+    def splitFile(filename,shards):
+        size = os.path.getsize(filename)
+        bounds = [0]
+        with open(filename,"rb") as f:
+            for i in range(1,shards):
+                f.seek(int(size*i/shards))
+                f.readline()
+                position = f.tell()
+                if position > bounds[-1] and position < size:
+                    bounds.append(position)
+        bounds.append(size)
+        return list(zip(bounds[:-1],bounds[1:]))
+
+    """
+        Yields the decoded lines starting within the byte range [start, end).
+    """
+    @staticmethod
+    def readRange(f,start,end,encoding):
+        f.seek(start)
+        position = start
+        for line in f:
+            if position >= end:
+                break
+            position += len(line)
+            yield line.decode(encoding if encoding is not None else "utf8")
+
+    """
+        Builds the predicate dispatch table for @processes. Returns a dict
+        mapping predicates to handlers and a list of handlers for all lines.
+        The data of each dependency is bound into the handler once here.
+    """
+    def getHandlers(self,processes):
+        handlers = {}
+        wildcards = []
+        for process in processes:
+            processLine = self.processes[process]["processLine"]
+            handler = (
+                    self.__getattribute__(processLine),
+                    self.persistent[process],
+                    self.getDependencyData(process)
+            )
+            predicate = self.predicates[processLine]
+            if predicate is None:
+                wildcards.append(handler)
+            else:
+                if predicate not in handlers:
+                    handlers[predicate] = []
+                handlers[predicate].append(handler)
+        return handlers, wildcards
+
+    """
+        Hands every line to the wildcard handlers and to the handlers of its
+        predicate.
+    """
+    def processLines(self,lines,handlers,wildcards):
+        for line in lines:
+            for processLineFunction, variable, dependency in wildcards:
+                processLineFunction(line,variable,dependency)
+            triple = line.split(" ",2)
+            if len(triple) < 3 or triple[1] not in handlers:
+                continue
+            for processLineFunction, variable, dependency in handlers[triple[1]]:
+                processLineFunction(line,variable,dependency)
+
+    """
+        Merges the result of a later part of a file into @target the same
+        way the line processor @processLine would have: entities are
+        appended once, attributes are overwritten (kept for processors in
+        firstValue) and attribute lists are extended (skipping values
+        already in the list unless the processor is in repeatedValues).
+    """
+    def mergeVariable(self,target,part,processLine=None):
+        if isinstance(target,dict):
+            for key, value in part.items():
+                if key in target and isinstance(value,list):
+                    self.mergeVariable(target[key],value,processLine)
+                elif key not in target or processLine not in self.firstValue:
+                    target[key] = value
+        elif isinstance(target,OrderedSet):
+            target |= part
+        elif len(target) > 0 and isinstance(target[0],dict):
+            for t, p in zip(target,part):
+                self.mergeVariable(t,p,processLine)
+        elif processLine in self.repeatedValues:
+            target.extend(part)
+        else:
+            seen = set(target)
+            for value in part:
+                if value not in seen:
+                    seen.add(value)
+                    target.append(value)
+
     ################## Process implementations ##################
     
+    """
+        Decodes the escape sequences of an N-Triples literal (\\uXXXX,
+        \\UXXXXXXXX, \\t, \\", \\\\, ...). Unknown sequences are kept.
+    """
+    @staticmethod
+    def unescape(text):
+        if "\\" not in text:
+            return text
+        return FileParser.escapes.sub(FileParser.unescapeMatch,text)
+
+    @staticmethod
+    def unescapeMatch(match):
+        code = match.group(1) or match.group(2)
+        if code is not None:
+            return chr(int(code,16))
+        character = match.group(3)
+        if character in FileParser.escapedCharacters:
+            return FileParser.escapedCharacters[character]
+        return match.group(0)
+    
+    """
+        Splits an N-Triples line into (subject, predicate, object) if its
+        predicate is @predicate, otherwise returns None. Literal objects are
+        returned with their quotes (escapes kept), language tags and
+        datatypes are dropped. Only the predicate is compared before the
+        object is parsed.
+    """
+    @staticmethod
+    def splitTriple(line,predicate):
+        triple = line.split(" ",2)
+        if len(triple) < 3 or triple[1] != predicate:
+            return None
+        rest = triple[2]
+        if rest.startswith('"'):
+            ### the closing quote is the last one on the line, tags and
+            ### datatype IRIs can not contain quotes
+            triple[2] = rest[:rest.rindex('"')+1]
+        else:
+            triple[2] = rest.split(" ",1)[0]
+        return triple
+    
     """
         Called to process file containing books.
     """
-    def processLineBooks(self,line,v,parameters):
+    def processLineBooks(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_conference):
             if line[0].startswith("<http://scigraph.springernature.com/things/books/"):
-                if line[0] not in v:
-                    v.append(line[0])
+                v.add(line[0])
                 
-    def processLineBooksConferences(self,line,v,parameters):
+    def processLineBooksConferences(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_conference):
@@ -442,206 +1588,204 @@ class FileParser:
     """
         Called to process file containing conferences.
     """
-    def processLineConferences(self,line,v,parameters):
+    def processLineConferences(self,line,v,dependency):
         line = line.split()
         
         if line[0].startswith("<http://scigraph.springernature.com/things/conferences/"):
-            if line[0] not in v:
-                v.append(line[0])
+            v.add(line[0])
                 
-    def processLineConferencesAttributeName(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineConferencesAttributeName(self,line,v,dependency):
+        line = self.splitTriple(line,nt_name)
         
-        if (line[1] == nt_name):
+        if (line is not None):
             if line[0].startswith("<http://scigraph.springernature.com/things/conferences/"):
-                v[line[0]] = line[2]
+                v[line[0]] = self.unescape(line[2])
             
-    def processLineConferencesAttributeAcronym(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineConferencesAttributeAcronym(self,line,v,dependency):
+        line = self.splitTriple(line,nt_acronym)
         
-        if (line[1] == nt_acronym):
+        if (line is not None):
             if line[0].startswith("<http://scigraph.springernature.com/things/conferences/"):
                 v[line[0]] = line[2]
                 
-    def processLineConferencesAttributeCity(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineConferencesAttributeCity(self,line,v,dependency):
+        line = self.splitTriple(line,nt_city)
         
-        if (line[1] == nt_city):
+        if (line is not None):
             if line[0].startswith("<http://scigraph.springernature.com/things/conferences/"):
                 v[line[0]] = line[2]
                 
-    def processLineConferencesAttributeCountry(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineConferencesAttributeCountry(self,line,v,dependency):
+        line = self.splitTriple(line,nt_country)
         
-        if (line[1] == nt_country):
+        if (line is not None):
             if line[0].startswith("<http://scigraph.springernature.com/things/conferences/"):
                 v[line[0]] = line[2]
                 
-    def processLineConferencesAttributeDateEnd(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineConferencesAttributeDateEnd(self,line,v,dependency):
+        line = self.splitTriple(line,nt_dateend)
         
-        if (line[1] == nt_dateend):
+        if (line is not None):
             if line[0].startswith("<http://scigraph.springernature.com/things/conferences/"):
                 v[line[0]] = line[2]
                 
-    def processLineConferencesAttributeDateStart(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineConferencesAttributeDateStart(self,line,v,dependency):
+        line = self.splitTriple(line,nt_datestart)
         
-        if (line[1] == nt_datestart):
+        if (line is not None):
             if line[0].startswith("<http://scigraph.springernature.com/things/conferences/"):
                 v[line[0]] = line[2]
                 
-    def processLineConferencesAttributeYear(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineConferencesAttributeYear(self,line,v,dependency):
+        line = self.splitTriple(line,nt_year)
         
-        if (line[1] == nt_year):
+        if (line is not None):
             if line[0].startswith("<http://scigraph.springernature.com/things/conferences/"):
                 v[line[0]] = line[2]
                 
-    def processLineConferenceseries(self,line,v,parameters):
+    def processLineConferenceseries(self,line,v,dependency):
         line = line.split()
         
         if line[0].startswith("<http://scigraph.springernature.com/things/conference-series/"):
-            if line[0] not in v:
-                v.append(line[0])
+            v.add(line[0])
                 
-    def processLineConferencesConferenceseries(self,line,v,parameters):
+    def processLineConferencesConferenceseries(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_conference_series):
             v[line[0]] = line[2]
             
-    def processLineConferenceseriesAttributeName(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineConferenceseriesAttributeName(self,line,v,dependency):
+        line = self.splitTriple(line,nt_name)
         
-        if (line[1] == nt_name):
+        if (line is not None):
             if line[0].startswith("<http://scigraph.springernature.com/things/conference-series/"):
-                v[line[0]] = line[2]
+                v[line[0]] = self.unescape(line[2])
     
                 
     """
         Called to process file containing chapters.
     """
-    def processLineChapters(self,line,v,parameters):
+    def processLineChapters(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_book):
-            if (line[2] in self.getData("books")):
-                if line[0] not in v:
-                    v.append(line[0])
+            if (line[2] in dependency):
+                v.add(line[0])
                     
-    def processLineChaptersAttributeTitle(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineChaptersAttributeTitle(self,line,v,dependency):
+        line = self.splitTriple(line,nt_title)
         
-        if (line[1] == nt_title):
-            if (line[0] in self.getData(parameters)):
+        if (line is not None):
+            if (line[0] in dependency):
                 v[line[0]] = line[2]
                 
-    def processLineChaptersAttributeLanguage(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineChaptersAttributeLanguage(self,line,v,dependency):
+        line = self.splitTriple(line,nt_language)
         
-        if (line[1] == nt_language):
-            if (line[0] in self.getData(parameters)):
+        if (line is not None):
+            if (line[0] in dependency):
                 v[line[0]] = line[2]
 
-    def processLineChaptersBooks(self,line,v,parameters):
+    def processLineChaptersBooks(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_book):
-            if (line[2] in self.getData("books")):
+            if (line[2] in dependency):
                 v[line[0]] = line[2]
                 
-    def processLineChaptersBookEditions(self,line,v,parameters):
+    def processLineChaptersBookEditions(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_book_edition):
-            if (line[0] in self.getData(parameters)):
+            if (line[0] in dependency):
                 v[line[0]] = line[2]
                                 
-    def processLineBookEditions(self,line,v,parameters):
+    def processLineBookEditions(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_book_edition):
-            if (line[0] in self.getData("books")):
-                if line[2] not in v:
-                    v.append(line[2])
+            if (line[0] in dependency):
+                v.add(line[2])
                     
-    def processLineBookEditionsAttributeMarketCodes(self,line,v,parameters):
+    def processLineBookEditionsAttributeMarketCodes(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_productmarketcode):
-            if (line[0] in self.getData("bookeditions")):
+            if (line[0] in dependency):
                 if line[0] not in v:
                     v[line[0]] = []
                 if line[2] not in v[line[0]]:
                     v[line[0]].append(line[2])
                     
-    def processLineMarketCodesAttributeName(self,line,v,parameters):
+    def processLineMarketCodesAttributeName(self,line,v,dependency):
         if ("@en" in line):
-            line = re.findall(self.regex, line)
+            line = self.splitTriple(line,nt_marketcode_name)
         
-            if(line[1] == nt_marketcode_name):
+            if (line is not None):
                 if line[0] not in v:
                     v[line[0]] = line[2]
    
-    def processLineContributions(self,line,v,parameters):
+    def processLineContributions(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_contribution):
-            if (line[0] in self.getData(parameters)):
-                if line[2] not in v:
-                    v.append(line[2])
+            if (line[0] in dependency):
+                v.add(line[2])
                     
-    def processLineContributionsChapters(self,line,v,parameters):
+    def processLineContributionsChapters(self,line,v,dependency):
         line = line.split()
         
         if (line[1] == nt_has_contribution):
-            if (line[0] in self.getData(parameters)):
+            if (line[0] in dependency):
                 v[line[2]] = line[0]
                 
-    def processLineContributionsAttributePublishedName(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineContributionsAttributePublishedName(self,line,v,dependency):
+        line = self.splitTriple(line,nt_publishedname)
         
-        if (line[1] == nt_publishedname):
-            if (line[0] in self.getData(parameters)):
-                v[line[0]] = line[2]
+        if (line is not None):
+            if (line[0] in dependency):
+                v[line[0]] = self.unescape(line[2])
 
-    def processLineContributionsAttributeIsCorresponding(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineContributionsAttributeIsCorresponding(self,line,v,dependency):
+        line = self.splitTriple(line,nt_iscorresponding)
         
-        if (line[1] == nt_iscorresponding):
-            if (line[0] in self.getData(parameters)):
+        if (line is not None):
+            if (line[0] in dependency):
                 v[line[0]] = line[2]
                 
-    def processLineContributionsAttributeOrder(self,line,v,parameters):
-        line = re.findall(self.regex, line)
+    def processLineContributionsAttributeOrder(self,line,v,dependency):
+        line = self.splitTriple(line,nt_order)
         
-        if (line[1] == nt_order):
-            if (line[0] in self.getData(parameters)):
+        if (line is not None):
+            if (line[0] in dependency):
                 v[line[0]] = line[2]
                 
     """
         Called to process file containing abstracts.
     """
-    def processLineChaptersAttributeAbstract(self,line,v,parameters):
+    def processLineChaptersAttributeAbstract(self,line,v,dependency):
         line = line.split(" ",2)
         
         if (line[1] == nt_abstract):
-            if (line[0] in self.getData(parameters)):
-                v[line[0]] = line[2][1:-3]
+            if (line[0] in dependency):
+                v[line[0]] = self.unescape(line[2][1:-3])
                 
     """
-        Called for Glove word embeddings
+        Called for Glove word embeddings, collected into an Embeddings
+        matrix.
     """
-    def processLineGlove(self,line,v,parameters):
-        line = line.strip("\n").split(" ")
-        key = line.pop(0)
-        v[key] = [float(i) for i in line]
+    def processLineGlove(self,line,v,dependency):
+        line = line.rstrip().split(" ")
+        if v.dimensions is None:
+            v.dimensions = len(line) - 1
+        ### some words of glove.840B contain spaces
+        v.add(" ".join(line[:-v.dimensions]),line[-v.dimensions:])
         
     """
         Parse the computer science ontology into a dict.
     """
-    def processLineCSO(self,line,v,parameters):
+    def processLineCSO(self,line,v,dependency):
         line = line.split(" ")
         l0 = self._remove_prefix(line[0])
         l2 = self._remove_prefix(line[2])
@@ -658,6 +1802,38 @@ class FileParser:
         return unquote(s.replace("<http://cso.kmi.open.ac.uk/topics/","")\
                 .replace(">",""))
 
+
+"""
+    Worker side of FileParser.processFileSharded and
+    FileParser.processFilesParallel.
+"""
+def _initShardWorker(dependencies):
+    global _shardDependencies
+    _shardDependencies = dependencies
+
+def _processShard(task):
+    filename, encoding, start, end, processes = task
+
+    parser = FileParser()
+    parser.persistent = dict(_shardDependencies)
+    for process in processes:
+        parser.persistent[process] = parser.newVariable(process)
+
+    handlers, wildcards = parser.getHandlers(processes)
+    if start is None:
+        ### the whole file
+        with parser.openRaw(filename,encoding) as (f, raw):
+            parser.processLines(f,handlers,wildcards)
+    else:
+        with open(filename,"rb") as f:
+            parser.processLines(
+                    FileParser.readRange(f,start,end,encoding),
+                    handlers,
+                    wildcards
+            )
+
+    return [parser.persistent[p] for p in processes]
+
     
     
 
@@ -748,17 +1924,19 @@ attributes_contribution = [
 #parser.getData("contributions_chapters_2013")
 
 def parseYear(year):
-    parser.getData("chapters_" + year)
-    parser.getData("chapters_books_" + year)
-    parser.getData("chapters_bookeditions_" + year)
-    parser.getData("chapters_" + year + "#title")
-    parser.getData("chapters_" + year + "#language")
-    parser.getData("chapters_" + year + "#abstract")
-    parser.getData("contributions_" + year)
-    parser.getData("contributions_" + year + "#publishedName")
-    parser.getData("contributions_" + year + "#isCorresponding")
-    parser.getData("contributions_" + year + "#order")
-    parser.getData("contributions_chapters_" + year)
+    parser.getDataFused([
+        "chapters_" + year,
+        "chapters_books_" + year,
+        "chapters_bookeditions_" + year,
+        "chapters_" + year + "#title",
+        "chapters_" + year + "#language",
+        "chapters_" + year + "#abstract",
+        "contributions_" + year,
+        "contributions_" + year + "#publishedName",
+        "contributions_" + year + "#isCorresponding",
+        "contributions_" + year + "#order",
+        "contributions_chapters_" + year
+    ])
     
 #parseYear("2012")
 #parseYear("2011")
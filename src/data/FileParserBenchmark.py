@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the N-Triples tokenizer of FileParser (splitTriple)
+against the regex the attribute line processors used before.
+"""
+
+###### Script parameters #######
+LINES = 200000
+REPEAT = 3
+#################################
+
+import re
+import timeit
+import random
+
+import FileParser
+
+nt_prefix = "<http://scigraph.springernature.com/"
+
+"""
+    Synthetic dump mixing the triples of a book chapter file: URI objects,
+    plain, escaped, language tagged and typed literals.
+"""
+def generate_fixture(lines):
+    random.seed(0)
+    objects = [
+            (FileParser.nt_has_book, nt_prefix + "things/books/{}>"),
+            (FileParser.nt_has_contribution, nt_prefix + "things/contributions/{}>"),
+            (FileParser.nt_title, '"Title {} with \\"escaped\\" quotes"'),
+            (FileParser.nt_language, '"En"'),
+            (FileParser.nt_abstract, '"Abstract {} > with brackets"@en'),
+            (FileParser.nt_order, '"{}"^^<http://www.w3.org/2001/XMLSchema#integer>')
+    ]
+    fixture = []
+    for i in range(lines):
+        predicate, obj = random.choice(objects)
+        fixture.append("{}things/book-chapters/{}> {} {} .\n".format(
+                nt_prefix,
+                i,
+                predicate,
+                obj.format(i)
+        ))
+    return fixture
+
+def run_regex(fixture,predicate):
+    regex = re.compile(FileParser.FileParser.regex)
+    matches = 0
+    for line in fixture:
+        line = regex.findall(line)
+        if (line[1] == predicate):
+            matches += 1
+    return matches
+
+def run_split(fixture,predicate):
+    splitTriple = FileParser.FileParser.splitTriple
+    matches = 0
+    for line in fixture:
+        line = splitTriple(line,predicate)
+        if (line is not None):
+            matches += 1
+    return matches
+
+fixture = generate_fixture(LINES)
+
+print("Lines: {}".format(LINES))
+for predicate in [FileParser.nt_title, FileParser.nt_order]:
+    print("Predicate: {}".format(predicate))
+    for name, function in [("regex",run_regex), ("splitTriple",run_split)]:
+        seconds = min(timeit.repeat(
+                lambda: function(fixture,predicate),
+                number=1,
+                repeat=REPEAT
+        ))
+        print("  {:<12} {:.3f} sec ({} matches)".format(name,seconds,function(fixture,predicate)))
+
+### values differ where the regex stops at escaped quotes or ">" in literals
+different = sum(
+        FileParser.FileParser.splitTriple(line,FileParser.nt_title)[2] != re.findall(FileParser.FileParser.regex,line)[2]
+        for line in fixture if line.split(" ",2)[1] == FileParser.nt_title
+)
+print("Titles parsed differently by the regex: {}".format(different))
@@ -35,7 +35,6 @@ d_test.data = d_test.data[["chapter_abstract","conferenceseries"]].copy()
 #    list(d_test.data[pd.isnull(d_test.data.chapter_abstract)].index),
 #    inplace=True
 #)
-d_test.data.chapter_abstract = d_test.data.chapter_abstract.str.decode("unicode_escape")
 
 d = DataLoader()
 d.conferenceseries()
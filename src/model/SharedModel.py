@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Hands a loaded model over to the worker processes of an evaluation pool
+without every worker loading its own copy.
+"""
+
+import atexit
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+class SharedModel:
+    """
+    Publishes a model loaded in the main process to worker processes.
+
+    The model is pickled once, but numeric arrays above a minimum size
+    (dense matrices, the buffers of sparse matrices, fitted estimator
+    attributes, ...) are written as .npy files next to the pickle instead.
+    Workers attach by unpickling the small remainder and memory mapping the
+    arrays, so all processes share the same pages and the model is read from
+    disk only once. The files are placed in /dev/shm if available and
+    removed by close or, at the latest, when the publishing process exits.
+    """
+
+    # arrays smaller than this many bytes stay in the pickle
+    min_size = 2**16
+
+    ##########################################
+    def __init__(self,model,directory=None):
+        """
+        Publishes the arrays and the pickle of the model.
+
+        Args:
+            model: The loaded model.
+            directory (str): Where to create the files (default: /dev/shm or the temp directory).
+        """
+        if directory is None and os.path.isdir("/dev/shm"):
+            directory = "/dev/shm"
+        self.path = tempfile.mkdtemp(prefix="shared-model-",dir=directory)
+        self.arrays = 0
+        # also if the evaluation fails before calling close
+        atexit.register(self.close)
+
+        try:
+            with open(os.path.join(self.path,"model.pkl"),"wb") as f:
+                pickler = pickle.Pickler(f,protocol=4)
+                pickler.persistent_id = self._persistent_id
+                pickler.dump(model)
+        except BaseException:
+            self.close()
+            raise
+
+    ##########################################
+    def _persistent_id(self,obj):
+        if not type(obj) is np.ndarray or obj.dtype.hasobject or obj.nbytes < self.min_size:
+            return None
+
+        name = "array.{}.npy".format(self.arrays)
+        self.arrays += 1
+        np.save(os.path.join(self.path,name),obj,allow_pickle=False)
+        return name
+
+    ##########################################
+    @staticmethod
+    def attach(path):
+        """
+        Loads a published model with its arrays memory mapped. Arrays are
+        mapped copy-on-write, so a model writing into them does not affect
+        other processes.
+
+        Args:
+            path (str): The path of the SharedModel.
+
+        Returns:
+            The model.
+        """
+        with open(os.path.join(path,"model.pkl"),"rb") as f:
+            unpickler = pickle.Unpickler(f)
+            unpickler.persistent_load = lambda name: np.load(
+                    os.path.join(path,name),
+                    mmap_mode="c"
+            ).view(np.ndarray)
+            return unpickler.load()
+
+    ##########################################
+    def close(self):
+        """
+        Removes the published files. Processes that attached keep their
+        mappings.
+        """
+        shutil.rmtree(self.path,ignore_errors=True)
+        atexit.unregister(self.close)
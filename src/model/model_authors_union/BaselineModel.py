@@ -95,7 +95,7 @@ class BaselineModel(AbstractModel):
             if not check in data.columns:
                 raise IndexError("Column '{}' not contained in given DataFrame.".format(check))
         
-        data.author_name = data.author_name.str.decode("unicode_escape").str.lower()
+        data.author_name = data.author_name.str.lower()
         data["count"] = 0
         self.data = data.groupby(["author_name","conferenceseries"]).count().reset_index()[["author_name","conferenceseries","count"]]
       
@@ -27,7 +27,7 @@ model.train(d.data)
 
 d = DataLoader()
 d.test_data("small").contributions()
-d.data.author_name = d.data.author_name.str.decode("unicode_escape").str.lower()
+d.data.author_name = d.data.author_name.str.lower()
 
 conferenceseries = d.data[["chapter","conferenceseries"]].copy().drop_duplicates().reset_index()
 authors = d.data.groupby("chapter")["author_name"].apply(list)
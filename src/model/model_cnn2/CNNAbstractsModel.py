@@ -68,13 +68,14 @@ class CNNAbstractsModel(AbstractModel):
         #print("transforming")
         
         vectors = self.embeddings_parser.transform_tensor_to_fixed_size(
-                batch,embeddings_size=self.embeddings_size,spatial_size=self.spatial_size
+                batch,embeddings_size=self.embeddings_size,spatial_size=self.spatial_size,reuse=True
         )
         del batch
       
         #print("inputs")
         
-        inputs = torch.FloatTensor(vectors)
+        # shares the memory of the reused tensor
+        inputs = torch.from_numpy(vectors)
         del vectors
             
         #print("forward")
@@ -26,6 +26,7 @@ sys.path.insert(0, os.path.join(os.getcwd(),".."))
 sys.path.insert(0, os.path.join(os.getcwd(),"..","..","data"))
 sys.path.insert(0, os.path.join(os.getcwd(),"..","evaluations"))
 from KeywordsUnionAbstractsModel import KeywordsUnionAbstractsModel
+from SharedModel import SharedModel
 
 # Generate model (main + child process).
 
@@ -40,12 +41,13 @@ def evaluate_model(batch):
     result = model.query_batch(batch)
     return result
 
-# Load model in child process.
+# Attach to the model shared by the main process (child process).
 
-if __name__ != '__main__':
+def attach_model(path):
+    global model
     sys.stderr = open("debug-multiprocessing.err."+str(os.getppid())+".txt", "w")
     sys.stdout = open("debug-multiprocessing.out."+str(os.getppid())+".txt", "w")
-    model._load_model(TRAINING_DATA)
+    model = SharedModel.attach(path)
 
 # Main script.
 
@@ -83,7 +85,17 @@ if __name__ == '__main__':
         global results
         results = r
     
-    pool = mp.Pool(processes=PROCESSES_EVALUATION)
+    # Load the model once and share it with the child processes.
+    
+    model._load_model(TRAINING_DATA)
+    shared = SharedModel(model)
+    model = SharedModel.attach(shared.path)
+    
+    pool = mp.Pool(
+            processes=PROCESSES_EVALUATION,
+            initializer=attach_model,
+            initargs=(shared.path,)
+    )
     job = pool.map_async(evaluate_model,minibatches,callback=process_ready)    
     pool.close()
     
@@ -98,7 +110,7 @@ if __name__ == '__main__':
         conferences.extend(result[0])
         confidences.extend(result[1])
         
-    model._load_model(TRAINING_DATA)
+    shared.close()
         
     recommendation = [conferences,confidences]
     
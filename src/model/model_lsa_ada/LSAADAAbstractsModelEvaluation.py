@@ -73,7 +73,6 @@ if __name__ == '__main__':
             list(d_train.data[pd.isnull(d_train.data.chapter_abstract)].index),
             inplace=True
         )
-        d_train.data.chapter_abstract = d_train.data.chapter_abstract.str.decode("unicode_escape")
         d_train.make_persistent(filename)
     
     model = LSAADAAbstractsModel(
@@ -95,7 +94,6 @@ if __name__ == '__main__':
             list(d_test.data[pd.isnull(d_test.data.chapter_abstract)].index),
             inplace=True
         )
-        d_test.data.chapter_abstract = d_test.data.chapter_abstract.str.decode("unicode_escape")
         d_test.make_persistent(filename)
 
     ### create test query and truth values
@@ -31,6 +31,7 @@ sys.path.insert(0, os.path.join(os.getcwd(),".."))
 sys.path.insert(0, os.path.join(os.getcwd(),"..","..","data"))
 sys.path.insert(0, os.path.join(os.getcwd(),"..","evaluations"))
 from TfIdfMaxAbstractsModel import TfIdfMaxAbstractsModel
+from SharedModel import SharedModel
 
 # Method to run in a multiprocessing process.
 
@@ -48,12 +49,11 @@ model = TfIdfMaxAbstractsModel(
         recs=MAX_RECS
 )
 
-# Child script.
+# Attach to the model shared by the main process (child process).
 
-if __name__ != '__main__':
-    #sys.stderr = open("debug-multiprocessing.err."+str(os.getppid())+".txt", "w")
-    #sys.stdout = open("debug-multiprocessing.out."+str(os.getppid())+".txt", "w")
-    model._load_model(TRAINING_DATA)
+def attach_model(path):
+    global model
+    model = SharedModel.attach(path)
 
 # Main script.
 
@@ -79,7 +79,6 @@ if __name__ == '__main__':
         list(d_test.data[pd.isnull(d_test.data.chapter_abstract)].index),
         inplace=True
     )
-    d_test.data.chapter_abstract = d_test.data.chapter_abstract.str.decode("unicode_escape")
     
     # Generate test query and truth values.
     
@@ -103,7 +102,17 @@ if __name__ == '__main__':
         global results
         results = r
     
-    pool = mp.Pool(processes=PROCESSES_EVALUATION)
+    # Load the model once and share it with the child processes.
+    
+    model._load_model(TRAINING_DATA)
+    shared = SharedModel(model)
+    model = SharedModel.attach(shared.path)
+    
+    pool = mp.Pool(
+            processes=PROCESSES_EVALUATION,
+            initializer=attach_model,
+            initargs=(shared.path,)
+    )
     job = pool.map_async(evaluate_model,minibatches,callback=process_ready)    
     pool.close()
     
@@ -118,7 +127,7 @@ if __name__ == '__main__':
         conferences.extend(result[0])
         confidences.extend(result[1])
         
-    model._load_model(TRAINING_DATA)
+    shared.close()
 
     ###################### SP VERSION ############################
     """
@@ -17,7 +17,7 @@ import pickle
 class TfIdfUnionAbstractsModel(AbstractModel):
     
     ##########################################
-    def __init__(self,concat=True,recs=10,min_df=0,max_df=1.0,ngram_range=(1,1),max_features=None):
+    def __init__(self,concat=True,recs=10,min_df=0,max_df=1.0,ngram_range=(1,1),max_features=None,chunk_size=None):
         self.stemmer = PorterStemmer()
         self.token_pattern = re.compile(r"(?u)\b\w\w+\b")
         self.stem_vectorizer = TfidfVectorizer(
@@ -32,6 +32,8 @@ class TfIdfUnionAbstractsModel(AbstractModel):
         # number of recommendations to return
         self.recs = recs
         self.concat = concat
+        # number of series compared to a batch at once (default: all)
+        self.chunk_size = chunk_size
         
         description = "-".join([
                 str(concat),
@@ -80,31 +82,64 @@ class TfIdfUnionAbstractsModel(AbstractModel):
                 str[]: name of the conference
                 double[]: confidence scores
         """
-        conferences = list()
-        confidences = list()
-        #self.count_init(len(batch))
-        
         q_v = (self.stem_vectorizer.transform(batch))
         #print("Abstracts transformed.")
         #print("Dimensionality of batch: {}".format(q_v.shape))
-        sim = cosine_similarity(q_v,self.stem_matrix)
+        
+        # keep the best series of each chunk, then the best of those
+        chunk_size = self.chunk_size or self.stem_matrix.shape[0]
+        rows = list()
+        sims = list()
+        for start in range(0,self.stem_matrix.shape[0],chunk_size):
+            sim = cosine_similarity(q_v,self.stem_matrix[start:start+chunk_size])
+            top, sim = self._top_k(sim)
+            rows.append(top + start)
+            sims.append(sim)
+        if len(rows) > 1:
+            rows = np.hstack(rows)
+            top, sims = self._top_k(np.hstack(sims))
+            rows = np.take_along_axis(rows,top,axis=1)
+        else:
+            rows = rows[0]
+            sims = sims[0]
         #print("Cosine similarity computed.")
-        o = np.argsort(-np.array(sim))
-        index = 0
         
-        for order in o:
-            conferences.append(
-                    list(self.data.iloc[order][0:self.recs].conferenceseries)
-            )
-            confidences.append(
-                    list(sim[index][order][0:self.recs])
-                    #sim[index][order][0:self.recs]
-            )
-            index += 1
-            #self.count()
+        conferences = [list(self.series[top]) for top in rows]
+        confidences = [list(sim) for sim in sims]
             
         return [conferences,confidences]
     
+    ##########################################
+    def _top_k(self,sim):
+        """
+            Selects the highest similarities of each row.
+            
+            Args:
+                sim (numpy.ndarray): The similarities of the queries (rows) to the series (columns).
+            
+            Returns:
+                numpy.ndarray: the columns of the 'self.recs' highest similarities of each row.
+                numpy.ndarray: the similarities.
+                Both are ordered by decreasing similarity and equal similarities by column.
+        """
+        k = min(self.recs,sim.shape[1])
+        if k < sim.shape[1]:
+            top = np.argpartition(-sim,k-1,axis=1)[:,:k]
+            # argpartition picks any of several equal similarities competing for the
+            # last places, in such rows take the lowest columns of them instead
+            kth = np.take_along_axis(sim,top,axis=1).min(axis=1)[:,None]
+            ties = np.flatnonzero((sim >= kth).sum(axis=1) > k)
+            if len(ties) > 0:
+                greater = sim[ties] > kth[ties]
+                equal = sim[ties] == kth[ties]
+                equal &= np.cumsum(equal,axis=1) <= k - greater.sum(axis=1,keepdims=True)
+                top[ties] = np.nonzero(greater | equal)[1].reshape(len(ties),k)
+        else:
+            top = np.tile(np.arange(k),(sim.shape[0],1))
+        sim = np.take_along_axis(sim,top,axis=1)
+        order = np.lexsort((top,-sim),axis=1)
+        return np.take_along_axis(top,order,axis=1), np.take_along_axis(sim,order,axis=1)
+    
     ##########################################
     def train(self,data,data_name):
         if not self._load_model(data_name):
@@ -118,6 +153,7 @@ class TfIdfUnionAbstractsModel(AbstractModel):
                 data.chapter_abstract = data.chapter_abstract + " "
                 data = data.groupby("conferenceseries").sum().reset_index()
             self.data = data
+            self.series = data.conferenceseries.values
             
             self.stem_matrix = self.stem_vectorizer.fit_transform(data.chapter_abstract)
             self._save_model(data_name)
@@ -150,6 +186,7 @@ class TfIdfUnionAbstractsModel(AbstractModel):
             with open(file,"rb") as f:
                 print("Loading persistent model.")
                 self.stem_matrix, self.stem_vectorizer, self.data = pickle.load(f)
+                self.series = self.data.conferenceseries.values
                 print("... loaded.")
                 return True
         
@@ -31,6 +31,7 @@ class TFIDFWordEmbeddingsMaxAbstractsModel(AbstractModel):
         description_embeddings = "-".join([
                 str(pretrained),
                 str(self.embedding_model),
+                "idf",
                 "{}"
         ])
     
@@ -33,6 +33,7 @@ class TFIDFWordEmbeddingsUnionAbstractsModel(AbstractModel):
                 str(concat),
                 str(pretrained),
                 str(self.embedding_model),
+                "idf",
                 "{}"
         ])
     
@@ -113,7 +113,7 @@ class BatchifiedEmbeddingsData():
             
             print("Preprocessing abstracts.")
             self.timer.tic()
-            inputs = list(self.d.data["chapter_abstract"].str.lower())
+            inputs = self.glove.token_ids(list(self.d.data["chapter_abstract"].str.lower()))
             self.timer.toc()
 
             chunks_max = math.ceil(len(inputs)/chunk_size)
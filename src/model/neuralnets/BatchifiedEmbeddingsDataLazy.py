@@ -57,7 +57,11 @@ class BatchifiedEmbeddingsDataLazy():
             self.device = torch.device("cpu")
         
         print("Loading word embeddings and parser.")
-        self.embeddings_parser = EmbeddingsParser()
+        if use_cuda:
+            # batches are copied to the device from reused pinned tensors
+            self.embeddings_parser = EmbeddingsParser(allocator=EmbeddingsParser.pinned_tensor)
+        else:
+            self.embeddings_parser = EmbeddingsParser()
         self.embeddings_parser.load_model(embeddings_model)
         self.embeddings_size = EmbeddingsParser.lengths[embeddings_model]
     
@@ -128,6 +132,14 @@ class BatchifiedEmbeddingsDataLazy():
                 del self.l
                 
         self.data_size = len(self.data_labels)
+        
+        print("Loading token ids.")
+        self.data_tokens = self.embeddings_parser.token_ids(
+                self.data_abstracts,
+                source=os.path.join(self.filepath,"abstracts.pkl")
+        )
+        # rows in the order of the batches, the token ids stay memory mapped
+        self.data_order = np.arange(len(self.data_tokens))
     
     ##################################################
     def batchify(self,batch_size,shuffle=True):
@@ -146,18 +158,16 @@ class BatchifiedEmbeddingsDataLazy():
         self.batch_max = len(self.batches)
         
         if shuffle:
-            order = np.arange(len(self.data_abstracts))
-            np.random.shuffle(order)
-            self.data_abstracts = self.data_abstracts[order]
-            self.data_labels = self.data_labels[order]
+            np.random.shuffle(self.data_order)
 
     ##################################################
     def next_batch(self):            
         i_from = self.batch_current*self.batch_size
         i_to = i_from + self.batch_size
+        rows = self.data_order[i_from:i_to]
 
         # get labels.
-        labels = self.data_labels[i_from:i_to]
+        labels = self.data_labels[rows]
         labels = torch.tensor(
                 labels,
                 device=self.device,
@@ -166,15 +176,12 @@ class BatchifiedEmbeddingsDataLazy():
 
         # get abstracts.
         batch = self.embeddings_parser.transform_tensor_to_fixed_size(
-                self.data_abstracts[i_from:i_to],
+                self.data_tokens[rows],
                 embeddings_size=self.embeddings_size,
-                spatial_size=300
-        )
-        batch = torch.tensor(
-                batch,
-                device=self.device,
-                dtype=torch.float32
+                spatial_size=300,
+                reuse=self.use_cuda
         )
+        batch = torch.from_numpy(batch).to(self.device)
         
         self.batch_current += 1
         
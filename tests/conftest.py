@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures: the source directories on sys.path (the modules import
+each other by name) and a small synthetic SciGraph dump.
+"""
+
+import os
+import sys
+
+import pytest
+
+src = os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","src")
+sys.path.insert(0, os.path.join(src,"data"))
+sys.path.insert(0, os.path.join(src,"model"))
+
+import FileParser
+
+T = "<http://scigraph.springernature.com/things/"
+O = "<http://scigraph.springernature.com/ontologies/core/"
+CSO = "<http://cso.kmi.open.ac.uk/topics/"
+
+YEAR = "2015"
+
+def write_dump(parser,release,books=40,chapters=200):
+    """
+    Writes the raw files of @release where @parser looks for them. Entities
+    are derived from their number, so two releases of different sizes
+    share most of their lines.
+    """
+    def path(dataset,license):
+        return parser.getRawFile(dataset,license,release)
+
+    with open(path("books","cc-by"),"w",encoding="utf8") as f:
+        for i in range(books):
+            b = T + "books/b{}>".format(i)
+            f.write("{} {}hasConference> {}conferences/c{}> .\n".format(b,O,T,i % 15))
+            f.write("{} {}hasBookEdition> {}book-editions/e{}> .\n".format(b,O,T,i))
+            f.write('{} {}title> "Book {}" .\n'.format(b,O,i))
+            for m in range(i % 3 + 1):
+                f.write("{}book-editions/e{}> {}hasProductMarketCode> {}product-market-codes/M{}> .\n".format(T,i,O,T,(i+m) % 5))
+
+    with open(path("product-market-codes","cc-by"),"w",encoding="utf8") as f:
+        for r in range(3):
+            for m in range(5):
+                # only the first english label of a code is kept
+                f.write('{}product-market-codes/M{}> <http://www.w3.org/2004/02/skos/core#prefLabel> "Code {} v{}"@en .\n'.format(T,m,m,r))
+                f.write('{}product-market-codes/M{}> <http://www.w3.org/2004/02/skos/core#prefLabel> "Kode {}"@de .\n'.format(T,m,m))
+
+    with open(path("conferences","cc-zero"),"w",encoding="utf8") as f:
+        for i in range(15):
+            c = T + "conferences/c{}>".format(i)
+            f.write('{} {}name> "Conference \\"{}\\" on caf\\u00e9s" .\n'.format(c,O,i))
+            f.write('{} {}acronym> "C{}" .\n'.format(c,O,i))
+            f.write('{} {}city> "City {}" .\n'.format(c,O,i))
+            f.write('{} {}country> "DE" .\n'.format(c,O))
+            f.write('{} {}dateEnd> "2015-01-0{}"^^<http://www.w3.org/2001/XMLSchema#date> .\n'.format(c,O,i % 9 + 1))
+            f.write('{} {}dateStart> "2015-01-0{}"^^<http://www.w3.org/2001/XMLSchema#date> .\n'.format(c,O,i % 9 + 1))
+            f.write('{} {}year> "2015" .\n'.format(c,O))
+            f.write("{} {}hasConferenceSeries> {}conference-series/s{}> .\n".format(c,O,T,i % 6))
+        for s in range(6):
+            f.write('{}conference-series/s{}> {}name> "Series {}" .\n'.format(T,s,O,s))
+
+    with open(path("book-chapters-" + YEAR,"cc-by"),"w",encoding="utf8") as f, \
+            open(path("book-chapters-" + YEAR,"cc-by-nc"),"w",encoding="utf8") as g:
+        for i in range(chapters):
+            ch = T + "book-chapters/{}-{}>".format(YEAR,i)
+            # some chapters belong to books that are not in the books file
+            b = i * 7 % (books + 5)
+            f.write("{} {}hasBook> {}books/b{}> .\n".format(ch,O,T,b))
+            f.write("{} {}hasBookEdition> {}book-editions/e{}> .\n".format(ch,O,T,b))
+            f.write('{} {}title> "Title \\"{}\\" with spaces" .\n'.format(ch,O,i))
+            f.write('{} {}language> "{}" .\n'.format(ch,O,"En" if i % 5 else "De"))
+            for a in range(2):
+                co = T + "contributions/{}-{}-{}>".format(YEAR,i,a)
+                f.write("{} {}hasContribution> {} .\n".format(ch,O,co))
+                f.write('{} {}publishedName> "Auth\\u00e9r {}" .\n'.format(co,O,a))
+                f.write('{} {}order> "{}" .\n'.format(co,O,a+1))
+                f.write('{} {}isCorresponding> "{}" .\n'.format(co,O,"true" if a == 0 else "false"))
+            g.write('{} {}abstract> "Abstract of chapter {} on caf\\u00e9s and \\"quotes\\"." .\n'.format(ch,O,i))
+
+def write_cso(filename,topics=30):
+    with open(filename,"w",encoding="utf8") as f:
+        for i in range(topics):
+            t = CSO + "topic{}>".format(i)
+            f.write('{} <http://kmi.open.ac.uk/projects/rexplore/ontologies/BiboExtension#primaryLabel> "topic {}" .\n'.format(t,i))
+            # parents are listed twice, the ontology keeps both entries
+            for repeat in range(2):
+                f.write("{} <http://www.w3.org/2004/02/skos/core#broaderGeneric> {}topic{}> .\n".format(t,CSO,i // 3))
+
+# processes of the synthetic dump
+processes = [
+        "books",
+        "books_conferences",
+        "bookeditions",
+        "bookeditions#marketcodes",
+        "marketcodes#name",
+        "conferences",
+        "conferences#name",
+        "conferences#acronym",
+        "conferences#city",
+        "conferences#country",
+        "conferences#dateend",
+        "conferences#datestart",
+        "conferences#year",
+        "conferenceseries",
+        "conferenceseries#name",
+        "conferences_conferenceseries"
+] + [
+        template.format(YEAR) for template in [
+                "chapters_{}",
+                "chapters_{}#abstract",
+                "chapters_{}#title",
+                "chapters_{}#language",
+                "chapters_books_{}",
+                "chapters_bookeditions_{}",
+                "contributions_{}",
+                "contributions_{}#publishedName",
+                "contributions_{}#isCorresponding",
+                "contributions_{}#order",
+                "contributions_chapters_{}"
+        ]
+]
+
+@pytest.fixture
+def scigraph(tmp_path,monkeypatch):
+    """
+    Points the FileParser at an empty raw and persistent directory and
+    writes the synthetic dump of release 2017-11-07 into the raw one.
+    Returns a function creating parsers on a persistent directory.
+    """
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(FileParser.FileParser,"path_raw",str(raw))
+    monkeypatch.setattr(FileParser.FileParser,"years",[int(YEAR)])
+
+    def parser(name="persistent",**kwargs):
+        persistent = tmp_path / name
+        persistent.mkdir(exist_ok=True)
+        monkeypatch.setattr(FileParser.FileParser,"path_persistent",str(persistent))
+        p = FileParser.FileParser(**kwargs)
+        # later parsers move the class attribute
+        p.path_persistent = str(persistent)
+        return p
+
+    write_dump(parser(),"2017-11-07")
+    return parser
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pandas as pd
+import pytest
+
+import DataLoader
+from conftest import YEAR
+
+@pytest.fixture
+def loader(scigraph,tmp_path,monkeypatch):
+    """
+    Returns a function creating DataLoaders on the synthetic dump, with the
+    year of the dump as training and test years and an empty dataset cache.
+    """
+    scigraph()
+    monkeypatch.setattr(DataLoader.DataLoader,"path_cache",str(tmp_path / "cache"))
+    monkeypatch.setattr(DataLoader.DataLoader,"training_years",lambda self, which="small": [YEAR])
+    monkeypatch.setattr(DataLoader.DataLoader,"test_years",lambda self, which="small": [YEAR])
+    return DataLoader.DataLoader
+
+################## Joins ##################
+
+def test_join_matches_a_left_merge(loader):
+    data = pd.DataFrame({"chapter":["<c3>","<c1>","<c2>","<c1>","<c4>"],"x":range(5)})
+    titles = pd.DataFrame({"chapter":["<c1>","<c2>","<c3>"],"title":["a","b","c"]})
+    books = pd.DataFrame({"chapter":["<c2>","<c3>","<c5>"],"book":["<b2>","<b3>","<b5>"]})
+    expected = pd.merge(pd.merge(data,titles,how="left",on="chapter"),books,how="left",on="chapter")
+    joined = loader()._join(data,"chapter",[titles,books])
+    pd.testing.assert_frame_equal(joined.reset_index(drop=True),expected)
+
+def merged_papers(parser):
+    """
+    The papers with their conferences and series as DataLoader built them
+    before _join, by merging the frames of each process.
+    """
+    def frame(process,columns):
+        return parser.getDataFrame(process.format(YEAR),columns)
+    df = frame("chapters_books_{}",["chapter","book"])
+    for process, column in [("chapters_bookeditions_{}","bookedition"),("chapters_{}#title","chapter_title"),("chapters_{}#language","chapter_language")]:
+        df = pd.merge(df,frame(process,["chapter",column]),how="left",on="chapter")
+    df = df[df.chapter_language=="En"]
+    conferences = frame("books_conferences",["book","conference"])
+    for attribute in ["acronym","city","country","dateend","datestart","name","year"]:
+        conferences = pd.merge(conferences,frame("conferences#" + attribute,["conference","conference_" + attribute]),how="left",on="conference")
+    df = pd.merge(df,conferences,how="left",on="book")
+    series = pd.merge(
+            frame("conferences_conferenceseries",["conference","conferenceseries"]),
+            frame("conferenceseries#name",["conferenceseries","conferenceseries_name"]),
+            how="left",
+            on="conferenceseries"
+    )
+    return pd.merge(df,series,how="left",on="conference")
+
+def test_papers_match_the_merged_frames(loader):
+    d = loader(cache=False).papers([YEAR]).conferences().conferenceseries()
+    expected = merged_papers(loader().parser)
+    assert len(d.data) > 0
+    pd.testing.assert_frame_equal(d.data,expected.reset_index(drop=True))
+
+################## Paper queries ##################
+
+def test_query_keeps_chapters_of_the_language(loader):
+    everything = loader().query([YEAR]).language(None).frame()
+    english = loader().query([YEAR]).frame()
+    assert set(everything.chapter_language) == {"En","De"}
+    expected = everything[everything.chapter_language=="En"].reset_index(drop=True)
+    pd.testing.assert_frame_equal(english,expected)
+
+    german = loader().query([YEAR]).language("De").frame()
+    assert len(german) + len(english) == len(everything)
+    assert (german.chapter_language=="De").all()
+
+def test_query_reads_only_selected_columns(loader):
+    d = loader()
+    data = d.query([YEAR]).language(None).columns("chapter_title").frame()
+    assert list(data.columns) == ["chapter","book","chapter_title"]
+    assert "chapters_{}#abstract".format(YEAR) not in d.parser.persistent
+
+    full = loader().query([YEAR]).language(None).frame()
+    pd.testing.assert_frame_equal(data,full[["chapter","book","chapter_title"]])
+
+def test_query_of_an_unknown_column_fails(loader):
+    with pytest.raises(KeyError):
+        loader().query([YEAR]).columns("chapter_title","chapter_isbn")
+
+def test_loaded_query_matches_papers(loader):
+    d = loader().query([YEAR]).load()
+    assert d.years == [YEAR]
+    pd.testing.assert_frame_equal(d.data,loader().papers([YEAR]).data)
+    with pytest.raises(AttributeError):
+        d.query([YEAR]).load()
+
+################## Dataset cache ##################
+
+def cached_files(d):
+    return sorted(os.listdir(d.path_cache))
+
+def test_cached_dataset_is_served_from_the_cache(loader):
+    first = loader().training_data_for_abstracts()
+    assert len(cached_files(first)) == 1
+
+    d = loader().training_data_for_abstracts()
+    assert d.data.equals(first.data)
+    assert d.years == first.years
+    ### nothing was parsed or read
+    assert d.parser.persistent == {} and d.parser.read == set()
+
+    uncached = loader(cache=False).training_data_for_abstracts()
+    assert uncached.data.equals(first.data)
+
+def test_cached_dataset_is_rebuilt_when_a_source_changes(loader):
+    first = loader().training_data_for_abstracts()
+    assert not first.data.chapter_abstract.str.contains("changed chapter").any()
+
+    parser = loader().parser
+    process = "chapters_{}#abstract".format(YEAR)
+    abstracts = parser.getData(process)
+    for chapter in list(abstracts)[:3]:
+        abstracts[chapter] = abstracts[chapter].replace("chapter","changed chapter")
+    parser.savePersistent(process)
+
+    d = loader().training_data_for_abstracts()
+    assert d.parser.read != set()
+    assert d.data.chapter_abstract.str.contains("changed chapter").sum() > 0
+    assert len(cached_files(d)) == 1
+
+def test_cache_evicts_least_recently_used_datasets(loader,monkeypatch):
+    d = loader()
+    os.makedirs(d.path_cache)
+    for i, name in enumerate(["a.pkl","b.pkl","c.pkl"]):
+        file = os.path.join(d.path_cache,name)
+        with open(file,"wb") as f:
+            f.write(b"x" * 100)
+        os.utime(file,(1000+i,1000+i))
+    monkeypatch.setattr(DataLoader.DataLoader,"cache_size",250)
+    d.evict_cache()
+    assert cached_files(d) == ["b.pkl","c.pkl"]
+
+def cache_file(d,method):
+    return os.path.join(d.path_cache,d.cache_key(method,"small",[YEAR]) + ".pkl")
+
+def test_cache_hit_marks_dataset_as_used(loader,monkeypatch):
+    d = loader()
+    loader().training_data_for_abstracts()
+    loader().training_data_for_keywords()
+    abstracts = cache_file(d,"training_data_for_abstracts")
+    keywords = cache_file(d,"training_data_for_keywords")
+    os.utime(abstracts,(1,1))
+    os.utime(keywords,(2,2))
+
+    loader().training_data_for_abstracts()
+    monkeypatch.setattr(DataLoader.DataLoader,"cache_size",os.path.getsize(abstracts))
+    d.evict_cache()
+    assert os.path.isfile(abstracts) and not os.path.isfile(keywords)
+
+def test_parser_is_restored_if_building_fails(loader,monkeypatch):
+    def fail(self):
+        raise RuntimeError("keyword bags")
+    monkeypatch.setattr(DataLoader.DataLoader,"keyword_bags",fail)
+
+    for cache in [True,False]:
+        d = loader(cache=cache)
+        with pytest.raises(RuntimeError):
+            d.training_data_for_keywords()
+        assert not d.parser.interned
+        assert d.parser.getDataFrame("books",["book"]).book.str.startswith("<").all()
+
+################## Keywords ##################
+
+def keyword_bags_per_row(data):
+    """
+    The keyword bags as the keyword methods built them before keyword_bags,
+    by summing the strings of each chapter.
+    """
+    data = data[["chapter","keyword","conferenceseries"]].copy()
+    data.keyword = data.keyword.str.replace("<http://scigraph.springernature.com/things/product-market-codes/","")
+    data.keyword = data.keyword.str[0:-1]
+    data.drop(list(data[pd.isnull(data.keyword)].index),inplace=True)
+    conferenceseries = data[["chapter","conferenceseries"]].drop_duplicates()
+    data.keyword = data.keyword + " "
+    return pd.merge(
+            data.groupby("chapter").sum().reset_index()[["chapter","keyword"]],
+            conferenceseries,
+            how="outer",
+            on="chapter"
+    )
+
+def test_keyword_bags_match_the_per_row_strings(loader):
+    code = "<http://scigraph.springernature.com/things/product-market-codes/{}>".format
+    data = pd.DataFrame({
+            "chapter":["<c2>","<c1>","<c2>","<c3>","<c1>","<c2>"],
+            "keyword":[code("M2"),code("M1"),code("M5"),None,code("M3"),code("M1")],
+            "conferenceseries":["<s1>","<s2>","<s1>","<s1>","<s2>","<s1>"],
+            "keyword_label":["x"] * 6
+    })
+    d = loader()
+    d.data = data
+    bags = d.keyword_bags().data
+    expected = keyword_bags_per_row(data)
+    assert bags.sort_values("chapter").values.tolist() == expected.sort_values("chapter").values.tolist()
+    assert bags.set_index("chapter").keyword.to_dict() == {"<c1>":"M1 M3 ","<c2>":"M2 M5 M1 "}
+
+def test_keyword_datasets_have_a_bag_per_chapter(loader):
+    d = loader(cache=False).training_data_for_keywords()
+    assert list(d.data.columns) == ["chapter","keyword","conferenceseries"]
+    assert d.data.chapter.is_unique and d.data.chapter.is_monotonic_increasing
+    assert d.data.keyword.str.match(r"^(M\d )+$").all()
+
+################## Chunks ##################
+
+def test_iterated_chunks_match_the_training_data(loader):
+    expected = loader(cache=False).training_data().data
+    d = loader(cache=False)
+    d.parser.persistent["cso_" + YEAR] = "not of the year"
+    chunks = list(d.iter_training_data(fields=(),chunk_size=7))
+    assert len(chunks) > 1 and all(len(chunk) <= 7 for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks,ignore_index=True),expected)
+
+    ### only the processes of the year are freed
+    assert [process for process in d.parser.persistent if YEAR in process] == ["cso_" + YEAR]
+
+def test_iterated_chunks_with_abstracts_and_shuffled(loader):
+    columns = ["bookedition","chapter_title","chapter_language","chapter_abstract"]
+    expected = loader(cache=False).query([YEAR]).columns(*columns).load().conferences().conferenceseries().data
+    chunks = loader(cache=False).iter_training_data(chunk_size=10,shuffle=True,seed=1)
+    data = pd.concat(chunks,ignore_index=True)
+    assert not data.chapter.equals(expected.chapter)
+    pd.testing.assert_frame_equal(
+            data.sort_values("chapter").reset_index(drop=True),
+            expected.sort_values("chapter").reset_index(drop=True)
+    )
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("gensim")
+pytest.importorskip("spacy")
+
+from EmbeddingsParser import EmbeddingsParser, TokenIds
+from FileParser import Embeddings
+
+docs = [[3,1,4],[],[1,5],[9,2,6,5],[3]]
+
+def token_ids(docs):
+    offsets = np.zeros(len(docs)+1,dtype=np.int64)
+    np.cumsum([len(d) for d in docs],out=offsets[1:])
+    ids = np.array([i for d in docs for i in d],dtype=np.int32)
+    return TokenIds(ids,offsets)
+
+def as_lists(tokens):
+    return [tokens.ids[tokens.offsets[i]:tokens.offsets[i+1]].tolist() for i in range(len(tokens))]
+
+@pytest.mark.parametrize("rows", [
+        slice(None),
+        slice(1,4),
+        slice(2,2),
+        slice(-2,None),
+        slice(4,1),
+        slice(None,None,2),
+        slice(None,None,-1)
+])
+def test_slices(rows):
+    tokens = token_ids(docs)
+    assert as_lists(tokens[rows]) == docs[rows]
+
+def test_contiguous_slices_are_views():
+    tokens = token_ids(docs)
+    assert np.shares_memory(tokens[1:4].ids,tokens.ids)
+
+@pytest.mark.parametrize("rows", [[3,0,3],[1],[],np.array([4,2])])
+def test_rows(rows):
+    tokens = token_ids(docs)
+    assert as_lists(tokens[rows]) == [docs[i] for i in rows]
+
+def test_lengths():
+    assert token_ids(docs).lengths().tolist() == [3,0,2,4,1]
+
+def test_save_and_load(tmp_path):
+    file = str(tmp_path / "tokens")
+    token_ids(docs).save(file)
+    tokens = TokenIds.load(file)
+    assert isinstance(tokens.ids,np.memmap)
+    assert as_lists(tokens) == docs
+    assert as_lists(tokens[[4,0]]) == [docs[4],docs[0]]
+
+@pytest.fixture
+def model(tmp_path,monkeypatch):
+    """
+    A small embedding model of three dimensions, registered as "test".
+    """
+    words = ["the","model","of","words","a"]
+    np.save(str(tmp_path / "vectors.npy"),np.arange(len(words)*3,dtype=np.float32).reshape(-1,3))
+    embeddings = Embeddings(str(tmp_path / "vectors.npy"),{w:i for i, w in enumerate(words)})
+    monkeypatch.setitem(EmbeddingsParser.models,"test",embeddings)
+    monkeypatch.setitem(EmbeddingsParser.lengths,"test",3)
+    return "test"
+
+def test_parallel_tokenization_matches_sequential(model):
+    sentences = ["the model of {} words".format("a " * (i % 4)) for i in range(23)] + ["", "unknown"]
+    sequential = EmbeddingsParser()
+    sequential.load_model(model)
+    parallel = EmbeddingsParser(workers=2,chunk_size=7)
+    parallel.load_model(model)
+    for batch_size in [1,5,7,100]:
+        expected = list(sequential._tokenize(sentences,batch_size))
+        batches = list(parallel._tokenize(sentences,batch_size))
+        assert [len(lengths) for ids, lengths in batches] == [len(lengths) for ids, lengths in expected]
+        for (ids, lengths), (expected_ids, expected_lengths) in zip(batches,expected):
+            assert ids.tolist() == expected_ids.tolist()
+            assert lengths.tolist() == expected_lengths.tolist()
+
+def test_interrupted_save_leaves_no_entry(tmp_path,monkeypatch):
+    file = str(tmp_path / "tokens")
+    save = np.save
+    def interrupted(name,array):
+        save(name,array[:1])
+        raise KeyboardInterrupt
+    monkeypatch.setattr(np,"save",interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        token_ids(docs).save(file)
+    assert not any(name.endswith((".ids.npy",".offsets.npy")) and ".part" not in name for name in os.listdir(tmp_path))
+
+def test_token_ids_of_a_source_file_are_cached_by_its_stat(model,tmp_path,monkeypatch):
+    monkeypatch.setattr(EmbeddingsParser,"path_token_ids",str(tmp_path / "token_ids"))
+    parser = EmbeddingsParser()
+    parser.load_model(model)
+    source = tmp_path / "abstracts.txt"
+    source.write_text("the model\nof words")
+    sentences = source.read_text().split("\n")
+
+    tokens = parser.token_ids(sentences,source=str(source))
+    assert as_lists(tokens) == [[0,1],[2,3]]
+    assert as_lists(parser.token_ids(sentences)) == [[0,1],[2,3]]
+    assert len(os.listdir(tmp_path / "token_ids")) == 4
+
+    ### the sentences are not read to find the entry of the source
+    assert as_lists(parser.token_ids(["x","y"],source=str(source))) == [[0,1],[2,3]]
+    source.write_text("a model\nof words")
+    os.utime(source,(1,1))
+    sentences = source.read_text().split("\n")
+    assert as_lists(parser.token_ids(sentences,source=str(source))) == [[4,1],[2,3]]
+
+def in_thread(function):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+def test_tensor_buffers_are_reused_per_thread():
+    parser = EmbeddingsParser()
+    tensor = parser._tensor_buffer((2,3,4))
+    tensor[:] = 1
+    again = parser._tensor_buffer((2,3,4))
+    assert again is tensor and not again.any()
+    assert parser._tensor_buffer((1,3,4)) is not tensor
+
+    other = in_thread(lambda: parser._tensor_buffer((2,3,4)))
+    assert other is not tensor
+    ### the tensor of the ended thread is handed to the next one
+    assert in_thread(lambda: parser._tensor_buffer((2,3,4))) is other
+    assert parser._tensor_buffer((2,3,4)) is tensor
+
+def test_concurrent_threads_hold_separate_tensors():
+    parser = EmbeddingsParser()
+    barrier = threading.Barrier(4)
+    tensors = []
+    def query():
+        tensor = parser._tensor_buffer((2,3,4))
+        barrier.wait()
+        tensors.append(tensor)
+    threads = [threading.Thread(target=query) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id,tensors))) == 4
+    assert len(parser.tensor_pool) <= parser.max_tensor_buffers
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+
+import bz2
+import gzip
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import FileParser
+from conftest import YEAR, processes, write_cso, write_dump
+
+def values(data):
+    """
+    Comparable form of parsed data, keeping the order of entities and keys.
+    """
+    if isinstance(data,dict):
+        return [(key, values(value)) for key, value in data.items()]
+    if isinstance(data,(list,tuple,FileParser.OrderedSet)):
+        return [values(value) for value in data]
+    return data
+
+def use_cso(parser,tmp_path):
+    parser.processes["cso"]["filename"] = str(tmp_path / "cso.nt")
+    parser.processes["cso"]["persistentFile"] = os.path.join(parser.path_persistent,"cso.pkl")
+    parser.processes["cso"]["persistentVariable"] = [{},{},{}]
+    if not os.path.isfile(parser.processes["cso"]["filename"]):
+        write_cso(parser.processes["cso"]["filename"])
+
+################## Shards ##################
+
+def test_split_file_starts_ranges_at_lines(tmp_path):
+    file = tmp_path / "lines.nt"
+    lines = [("x" * (i * 37 % 101)) + "\n" for i in range(200)]
+    file.write_text("".join(lines))
+    size = os.path.getsize(file)
+
+    for shards in [1,2,3,7,16,500]:
+        ranges = FileParser.FileParser.splitFile(str(file),shards)
+        assert len(ranges) <= shards
+        assert ranges[0][0] == 0 and ranges[-1][1] == size
+        with open(file,"rb") as f:
+            data = f.read()
+            read = []
+            for start, end in ranges:
+                assert start < end
+                assert start == 0 or data[start-1:start] == b"\n"
+                read.extend(FileParser.FileParser.readRange(f,start,end,"utf8"))
+        for (_, end), (start, _) in zip(ranges[:-1],ranges[1:]):
+            assert end == start
+        assert read == lines
+
+def test_read_range_includes_line_crossing_end(tmp_path):
+    file = tmp_path / "lines.nt"
+    file.write_bytes(b"aaaa\nbbbb\ncccc\n")
+    with open(file,"rb") as f:
+        assert list(FileParser.FileParser.readRange(f,0,7,"utf8")) == ["aaaa\n","bbbb\n"]
+        assert list(FileParser.FileParser.readRange(f,5,10,"utf8")) == ["bbbb\n"]
+        assert list(FileParser.FileParser.readRange(f,10,15,"utf8")) == ["cccc\n"]
+
+def test_sharded_parsing_matches_sequential(scigraph,tmp_path):
+    sequential = scigraph("sequential")
+    use_cso(sequential,tmp_path)
+    expected = {p:values(sequential.getData(p)) for p in processes + ["cso"]}
+
+    sharded = scigraph("sharded",workers=2)
+    use_cso(sharded,tmp_path)
+    for process in sharded.orderProcesses(processes + ["cso"]):
+        filename = sharded.processes[process]["filename"]
+        assert len(sharded.splitFile(filename,sharded.workers*4)) > 1
+        ### one process per call, so every file is split into shards
+        sharded.getDataFused([process])
+
+    for process in processes + ["cso"]:
+        assert values(sharded.getData(process)) == expected[process], process
+
+def test_fused_parallel_parsing_matches_sequential(scigraph):
+    sequential = scigraph("sequential")
+    expected = {p:values(sequential.getData(p)) for p in processes}
+
+    parallel = scigraph("parallel",workers=2)
+    parallel.getDataFused(processes)
+    for process in processes:
+        assert values(parallel.getData(process)) == expected[process], process
+
+def test_merge_keeps_first_value_of_first_value_processors():
+    parser = FileParser.FileParser()
+    target = {"a":"1","b":"2"}
+    parser.mergeVariable(target,{"b":"3","c":"4"},"processLineMarketCodesAttributeName")
+    assert target == {"a":"1","b":"2","c":"4"}
+    parser.mergeVariable(target,{"b":"3"},"processLineConferencesAttributeName")
+    assert target["b"] == "3"
+
+def test_merge_keeps_repeated_values_of_repeated_value_processors():
+    parser = FileParser.FileParser()
+    target = [{"p":["a","b"]},{},{}]
+    parser.mergeVariable(target,[{"p":["a","c"]},{},{}],"processLineCSO")
+    assert target[0]["p"] == ["a","b","a","c"]
+    target = {"e":["a","b"]}
+    parser.mergeVariable(target,{"e":["a","c"]},"processLineBookEditionsAttributeMarketCodes")
+    assert target["e"] == ["a","b","c"]
+
+################## Entity sets and persistence ##################
+
+def test_ordered_set_keeps_insertion_order():
+    s = FileParser.OrderedSet(["c","a","c","b"])
+    assert list(s) == ["c","a","b"]
+    assert len(s) == 3 and "a" in s and "d" not in s
+    s.add("a")
+    s.add("d")
+    s.discard("c")
+    s.discard("x")
+    assert list(s) == ["a","b","d"]
+    s |= ["e","a"]
+    assert list(s) == ["a","b","d","e"]
+
+def write_pickle(parser,process,data):
+    with open(parser.processes[process]["persistentFile"],"wb") as f:
+        pickle.dump(data,f)
+
+def test_unversioned_pickles_are_upgraded(scigraph):
+    parser = scigraph()
+    write_pickle(parser,"books",["<b2>","<b1>","<b3>"])
+    write_pickle(parser,"books_conferences",{"<b2>":"<c1>"})
+    assert parser.loadPersistent("books")
+    assert parser.loadPersistent("books_conferences")
+    assert isinstance(parser.persistent["books"],FileParser.OrderedSet)
+    assert list(parser.persistent["books"]) == ["<b2>","<b1>","<b3>"]
+    assert parser.persistent["books_conferences"] == {"<b2>":"<c1>"}
+
+def test_persistent_data_round_trips(scigraph):
+    parser = scigraph()
+    expected = {p:values(parser.getData(p)) for p in processes}
+
+    loaded = scigraph()
+    for process in processes:
+        assert loaded.loadPersistent(process)
+        assert values(loaded.persistent[process]) == expected[process], process
+    assert isinstance(loaded.persistent["chapters_2015"],FileParser.OrderedSet)
+
+def test_embedding_dicts_are_upgraded_to_a_matrix(scigraph,tmp_path):
+    parser = scigraph()
+    parser.processes["glove.6d50"]["persistentFile"] = str(tmp_path / "glove.pkl")
+    parser.processes["glove.6d50"]["persistentVariable"] = FileParser.Embeddings(str(tmp_path / "glove.npy"))
+    write_pickle(parser,"glove.6d50",{"__version__":2,"data":{"a":[1.0,2.0],"b":[3.0,4.0]}})
+
+    assert parser.loadPersistent("glove.6d50")
+    embeddings = parser.persistent["glove.6d50"]
+    assert isinstance(embeddings,FileParser.Embeddings)
+    assert list(embeddings) == ["a","b"]
+    assert embeddings["b"].tolist() == [3.0,4.0]
+    assert embeddings.getVectors().dtype.name == "float32"
+
+################## URIs ##################
+
+def uris(entity,keys):
+    return pd.Series([FileParser.URITable.prefix + entity + "/" + k + ">" for k in keys])
+
+def test_uri_table_round_trip(tmp_path):
+    file = str(tmp_path / "uris.pkl")
+    table = FileParser.URITable(file)
+    books = uris("books",["b2","b1","b2","b3"])
+    ids = table.intern("book",books)
+    assert ids.dtype.name == "int32"
+    assert ids[0] == ids[2] and len(set(ids)) == 3
+    assert table.resolve("books",ids).tolist() == books.tolist()
+    table.save()
+
+    ### ids are kept across loads, new URIs are appended
+    table = FileParser.URITable(file)
+    more = uris("books",["b4","b1"])
+    assert table.intern("book",more).tolist() == [3,ids[1]]
+    df = pd.DataFrame({"book":table.intern("book",books),"n":[1,2,3,4]})
+    assert table.resolveFrame(df).book.tolist() == books.tolist()
+    assert df.n.tolist() == [1,2,3,4]
+
+def test_uri_table_leaves_other_columns(tmp_path):
+    table = FileParser.URITable(str(tmp_path / "uris.pkl"))
+    columns = [
+            pd.Series(["a","b"]),
+            pd.Series([FileParser.URITable.prefix + "books/b1>",None]),
+            pd.concat([uris("books",["b1"]),uris("conferences",["c1"])],ignore_index=True),
+            uris("unknown",["u1"]),
+            pd.Series([["<x>"],["<y>"]])
+    ]
+    for column in columns:
+        assert table.intern("x",column) is column
+    assert not table.changed
+
+def test_interned_frames_resolve_to_uri_frames(scigraph):
+    parser = scigraph()
+    expected = parser.getDataFrame("chapters_books_2015",["chapter","book"])
+
+    interned = scigraph(interned=True)
+    df = interned.getDataFrame("chapters_books_2015",["chapter","book"])
+    assert df.chapter.dtype.name == "int32" and df.book.dtype.name == "int32"
+    resolved = interned.getURIs().resolveFrame(df)
+    assert resolved.equals(expected)
+
+################## Incremental updates ##################
+
+def unordered(data):
+    if isinstance(data,dict):
+        return {key:unordered(value) for key, value in data.items()}
+    if isinstance(data,FileParser.OrderedSet):
+        return set(data)
+    if isinstance(data,list):
+        return sorted(data)
+    return data
+
+def test_diff_file_finds_removed_and_added_lines(tmp_path):
+    old = tmp_path / "old.nt"
+    new = tmp_path / "new.nt.gz"
+    old.write_text("a\nb\nc\n")
+    with gzip.open(new,"wt") as f:
+        f.write("c\nd\na\n")
+    parser = FileParser.FileParser()
+    removed, added = parser.diffFile(str(old),str(new),"utf8")
+    assert removed == ["b\n"] and added == ["d\n"]
+
+def test_apply_delta_updates_attributes(scigraph,tmp_path):
+    parser = scigraph()
+    acronym = FileParser.nt_acronym
+    c = FileParser.URITable.prefix + "conferences/"
+    new = tmp_path / "new.nt"
+    new.write_text("".join('{}{}> {} "{}" .\n'.format(c,i,acronym,a) for i, a in [(1,"A"),(2,"C"),(3,"D")]))
+    parser.processes["conferences#acronym"]["filename"] = str(new)
+    parser.persistent["conferences#acronym"] = {c + "1>":'"A"',c + "2>":'"B"'}
+    changed = parser.applyDelta(
+            "conferences#acronym",
+            ['{}2> {} "B" .\n'.format(c,acronym)],
+            ['{}2> {} "C" .\n'.format(c,acronym),'{}3> {} "D" .\n'.format(c,acronym)]
+    )
+    assert changed
+    assert parser.persistent["conferences#acronym"] == {c + "1>":'"A"',c + "2>":'"C"',c + "3>":'"D"'}
+    assert not parser.applyDelta("conferences#acronym",[],[])
+
+def test_update_matches_full_parse(scigraph):
+    parser = scigraph()
+    parser.getDataFused(processes)
+    write_dump(parser,"2018-01-01",books=45,chapters=230)
+
+    updated = scigraph(release="2018-01-01")
+    assert len(updated.updateData(processes)) > 0
+    full = scigraph("full",release="2018-01-01")
+    for process in processes:
+        assert unordered(updated.getData(process)) == unordered(full.getData(process)), process
+
+    ### nothing changed since
+    assert scigraph(release="2018-01-01").updateData(processes) == []
+
+def test_update_of_repeated_subjects_matches_full_parse(scigraph):
+    parser = scigraph()
+    write_dump(parser,"2018-01-01")
+    T = FileParser.URITable.prefix
+    chapter = "{}book-chapters/{}-1>".format(T,YEAR)
+    ### the old release has a second title and book for a chapter, the
+    ### new one drops the first english label of a market code
+    with open(parser.getRawFile("book-chapters-" + YEAR,"cc-by"),"a",encoding="utf8") as f:
+        f.write('{} {} "Second title" .\n'.format(chapter,FileParser.nt_title))
+        f.write("{} {} {}books/b3> .\n".format(chapter,FileParser.nt_has_book,T))
+    codes = parser.getRawFile("product-market-codes","cc-by","2018-01-01")
+    with open(codes,encoding="utf8") as f:
+        lines = [line for line in f if '"Code 0 v0"' not in line]
+    with open(codes,"w",encoding="utf8") as f:
+        f.writelines(lines)
+    parser.getDataFused(processes)
+    assert parser.getData("chapters_{}#title".format(YEAR))[chapter] == '"Second title"'
+
+    updated = scigraph(release="2018-01-01")
+    assert len(updated.updateData(processes)) > 0
+    full = scigraph("full",release="2018-01-01")
+    for process in processes:
+        assert unordered(updated.getData(process)) == unordered(full.getData(process)), process
+    assert updated.getData("marketcodes#name")[T + "product-market-codes/M0>"] == '"Code 0 v1"'
+
+def test_fresh_parse_does_not_append_to_earlier_data(scigraph):
+    parser = scigraph()
+    books = list(parser.getData("books"))
+    parser.getDataFused(["books"],refresh=["books"])
+    assert list(parser.getData("books")) == books
+    assert len(parser.processes["books"]["persistentVariable"]) == 0
+
+def test_fingerprints_are_stored_next_to_the_pickles(scigraph):
+    parser = scigraph()
+    parser.getData("books")
+    file = parser.getFingerprintFile("books")
+    assert file == os.path.splitext(parser.processes["books"]["persistentFile"])[0] + ".fingerprint"
+    assert parser.loadFingerprint("books")["filename"] == parser.processes["books"]["filename"]
+    assert not any(name.endswith("fingerprints.pkl") for name in os.listdir(parser.path_persistent))
+
+################## Compressed dumps ##################
+
+extensions = {"gzip":".gz","bz2":".bz2","zstd":".zst"}
+
+def compress(filename,compression):
+    target = filename + extensions[compression]
+    if compression == "gzip":
+        with open(filename,"rb") as f, gzip.open(target,"wb") as g:
+            shutil.copyfileobj(f,g)
+    elif compression == "bz2":
+        with open(filename,"rb") as f, bz2.open(target,"wb") as g:
+            shutil.copyfileobj(f,g)
+    else:
+        subprocess.run(["zstd","-q","--rm",filename,"-o",target],check=True)
+    if os.path.isfile(filename):
+        os.remove(filename)
+
+def compress_dump(parser,compression):
+    if compression == "zstd" and shutil.which("zstd") is None:
+        pytest.skip("zstd command line tool not installed")
+    for name in os.listdir(parser.path_raw):
+        compress(os.path.join(parser.path_raw,name),compression)
+
+@pytest.mark.parametrize("compression", ["gzip","bz2","zstd"])
+def test_compressed_dumps_parse_like_plain_ones(scigraph,compression):
+    plain = scigraph("plain")
+    expected = {p:values(plain.getData(p)) for p in processes}
+
+    compress_dump(plain,compression)
+    compressed = scigraph("compressed")
+    filename = compressed.processes["books"]["filename"]
+    assert filename.endswith(extensions[compression])
+    assert compressed.getCompression(filename) == compression
+    for process in processes:
+        assert values(compressed.getData(process)) == expected[process], process
+
+def test_zstd_falls_back_to_the_command_line_tool(scigraph,monkeypatch):
+    plain = scigraph("plain")
+    expected = values(plain.getData("books"))
+    compress_dump(plain,"zstd")
+    monkeypatch.setitem(sys.modules,"zstandard",None)
+    started = []
+    class Popen(subprocess.Popen):
+        def __init__(self,*args,**kwargs):
+            super().__init__(*args,**kwargs)
+            started.append(self)
+    monkeypatch.setattr(subprocess,"Popen",Popen)
+
+    parser = scigraph("compressed")
+    assert values(parser.getData("books")) == expected
+    assert len(started) == 1 and started[0].returncode == 0
+
+    ### a failing parse still closes and reaps the tool
+    def fail(line,v,dependency):
+        raise RuntimeError("parse error")
+    monkeypatch.setattr(parser,"processLineBooksConferences",fail)
+    with pytest.raises(RuntimeError):
+        parser.getData("books_conferences")
+    assert len(started) == 2
+    assert started[1].stdout.closed and started[1].returncode is not None
+
+################## Triples ##################
+
+@pytest.mark.parametrize("line, expected", [
+        ('<s> <p> <o> .\n', ["<s>","<p>","<o>"]),
+        ('<s> <p> "a literal with spaces" .\n', ["<s>","<p>",'"a literal with spaces"']),
+        ('<s> <p> "say \\"hi\\" twice" .\n', ["<s>","<p>",'"say \\"hi\\" twice"']),
+        ('<s> <p> "label"@en .\n', ["<s>","<p>",'"label"']),
+        ('<s> <p> "2015"^^<http://www.w3.org/2001/XMLSchema#gYear> .\n', ["<s>","<p>",'"2015"']),
+        ('<s> <p> "" .\n', ["<s>","<p>",'""'])
+])
+def test_split_triple(line, expected):
+    assert FileParser.FileParser.splitTriple(line,"<p>") == expected
+
+def test_split_triple_skips_other_predicates():
+    assert FileParser.FileParser.splitTriple('<s> <q> "x" .\n',"<p>") is None
+    assert FileParser.FileParser.splitTriple("<s> <p>\n","<p>") is None
+    assert FileParser.FileParser.splitTriple("\n","<p>") is None
+
+################## Escapes ##################
+
+@pytest.mark.parametrize("text, expected", [
+        ("plain text", "plain text"),
+        ("caf\\u00e9", "café"),
+        ("\\U0001F600", "\U0001F600"),
+        ("tab\\tnewline\\n", "tab\tnewline\n"),
+        ('\\"quoted\\"', '"quoted"'),
+        ("back\\\\slash", "back\\slash"),
+        ("\\\\u00e9", "\\u00e9"),
+        ("unknown \\x sequence", "unknown \\x sequence"),
+        ("trailing \\", "trailing \\")
+])
+def test_unescape(text, expected):
+    assert FileParser.FileParser.unescape(text) == expected
+
+def test_escaped_pickles_are_unescaped_on_upgrade(scigraph):
+    parser = scigraph()
+    write_pickle(parser,"conferences#name",{"<c>":'"caf\\u00e9 \\"A\\""'})
+    write_pickle(parser,"conferences#acronym",{"<c>":'"caf\\u00e9"'})
+    parser.loadPersistent("conferences#name")
+    parser.loadPersistent("conferences#acronym")
+    assert parser.persistent["conferences#name"] == {"<c>":'"café "A""'}
+    ### only the processors in FileParser.unescaped decode literals
+    assert parser.persistent["conferences#acronym"] == {"<c>":'"caf\\u00e9"'}
+
+def test_parsed_literals_are_unescaped(scigraph):
+    parser = scigraph()
+    names = parser.getData("conferences#name")
+    assert names[FileParser.URITable.prefix + "conferences/c1>"] == '"Conference "1" on cafés"'
+    titles = parser.getData("chapters_2015#title")
+    assert '"Title \\"1\\" with spaces"' in titles.values()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import multiprocessing as mp
+import os
+
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+from SharedModel import SharedModel
+
+class Model:
+    def __init__(self):
+        self.matrix = np.arange(100000,dtype=np.float64).reshape(1000,100)
+        self.sparse = sparse_random(2000,300,density=0.1,format="csr",random_state=1)
+        self.small = np.arange(5)
+        self.names = np.array(["a","b"],dtype=object)
+
+def attach(path):
+    model = SharedModel.attach(path)
+    return (
+            model.matrix.sum(),
+            model.sparse.toarray().sum(),
+            isinstance(model.matrix,np.memmap) or model.matrix.base is not None
+    )
+
+def test_published_model_round_trips_in_workers(tmp_path):
+    model = Model()
+    shared = SharedModel(model,directory=str(tmp_path))
+    arrays = [name for name in os.listdir(shared.path) if name.endswith(".npy")]
+    ### the matrix and the sparse buffers, small arrays stay in the pickle
+    assert len(arrays) == 3
+
+    attached = SharedModel.attach(shared.path)
+    assert np.array_equal(attached.matrix,model.matrix)
+    assert (attached.sparse != model.sparse).nnz == 0
+    assert np.array_equal(attached.small,model.small)
+    assert attached.names.tolist() == ["a","b"]
+    ### copy-on-write mappings
+    attached.matrix[0,0] = -1
+    assert SharedModel.attach(shared.path).matrix[0,0] == 0
+
+    with mp.get_context("fork").Pool(2) as pool:
+        results = pool.map(attach,[shared.path] * 2)
+    for matrix, sparse, mapped in results:
+        assert matrix == model.matrix.sum()
+        assert np.isclose(sparse,model.sparse.sum())
+        assert mapped
+
+    shared.close()
+    assert not os.path.exists(shared.path)
+
+def test_published_files_are_removed_at_exit(tmp_path,monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit,"register",registered.append)
+    unregistered = []
+    monkeypatch.setattr(atexit,"unregister",unregistered.append)
+
+    shared = SharedModel(Model(),directory=str(tmp_path))
+    assert registered == [shared.close]
+    ### what atexit runs if the evaluation fails before close
+    registered[0]()
+    assert not os.path.exists(shared.path)
+    assert unregistered == [shared.close]
+
+def test_failed_publishing_removes_the_files(tmp_path):
+    class Unpicklable:
+        def __reduce__(self):
+            raise TypeError("not picklable")
+    with pytest.raises(TypeError):
+        SharedModel(Unpicklable(),directory=str(tmp_path))
+    assert os.listdir(tmp_path) == []
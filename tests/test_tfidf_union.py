@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("nltk")
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","src","model","model_tfidf_union"))
+from TfIdfUnionAbstractsModel import TfIdfUnionAbstractsModel
+
+def model(recs,chunk_size=None):
+    # without __init__, which creates the directory of the persisted model
+    m = TfIdfUnionAbstractsModel.__new__(TfIdfUnionAbstractsModel)
+    m.recs = recs
+    m.chunk_size = chunk_size
+    return m
+
+def stable_top_k(sim,k):
+    top = np.argsort(-sim,axis=1,kind="stable")[:,:k]
+    return top, np.take_along_axis(sim,top,axis=1)
+
+@pytest.mark.parametrize("recs", [1,3,10,40,60])
+def test_top_k_matches_stable_argsort(recs):
+    random = np.random.default_rng(recs)
+    # few distinct values, so most rows have ties at the k-th similarity
+    sim = np.round(random.random((30,40)),1)
+    sim[:5] = 0
+    sim[5] = sim[6]
+    top, values = model(recs)._top_k(sim)
+    expected_top, expected_values = stable_top_k(sim,recs)
+    assert np.array_equal(top,expected_top)
+    assert np.array_equal(values,expected_values)
+
+@pytest.mark.parametrize("chunk_size", [None,1,4,7,100])
+def test_query_batch_matches_full_ranking(chunk_size):
+    series = ["s{}".format(i) for i in range(12)]
+    corpus = [" ".join("w{}".format((i * j) % 17) for j in range(i + 3)) for i in range(12)]
+    corpus[7] = corpus[2]
+    queries = ["w1 w2 w3","w5","unknown words","w2 w4 w6 w8 w10"]
+
+    m = model(5,chunk_size)
+    m.stem_vectorizer = TfidfVectorizer()
+    m.stem_matrix = m.stem_vectorizer.fit_transform(corpus)
+    m.series = np.array(series,dtype=object)
+    conferences, confidences = m.query_batch(queries)
+
+    sim = cosine_similarity(m.stem_vectorizer.transform(queries),m.stem_matrix)
+    top, values = stable_top_k(sim,5)
+    assert conferences == [[series[i] for i in row] for row in top]
+    assert confidences == [list(row) for row in values]